@@ -0,0 +1,296 @@
+import bson
+from pymongo import DeleteMany, DeleteOne
+
+
+class FakeCollection:
+    """
+    In-process stand-in for a pymongo collection, implementing what the dashboard and the
+    summarize scripts use: find (with sort/limit)/find_one (filters with $ne, $gt/$gte/$lt/$lte, $in, $exists and
+    $or), find_raw_batches, aggregate ($match, $sort, $group with $first, $project), update_many,
+    delete_many, bulk_write of UpdateOne upserts ($set, $setOnInsert, $inc, $max, $unset) and
+    DeleteMany/DeleteOne, and create_index/drop_index (no-ops). The one-off migrations of
+    scripts/migrations.py therefore run against it as they do against MongoDB.
+    - Upserts on equality filters are resolved through a hash index per set of filter fields,
+      so ingesting n documents costs O(n) and not O(n^2).
+    - The raw BSON batches of a projection are encoded once and kept until the next write, as
+      the server would do the projection: the loaders are timed on decoding only.
+    """
+
+    def __init__(self, name="collection", documents=None):
+        self.name = name
+        self.documents = []
+        self._indexes = {}
+        self._raw_batches = {}
+        self.insert_many(documents or [])
+
+    def insert_many(self, documents):
+        for document in documents:
+            self._insert(dict(document))
+
+    def count_documents(self, filter):
+        return sum(1 for _ in self._match(filter))
+
+    def find(self, filter=None, projection=None, sort=None):
+        documents = list(self._match(filter))
+        for field, direction in reversed(sort or []):
+            documents.sort(key=lambda document: _sort_key(document.get(field)), reverse=direction < 0)
+        return FakeCursor(_project(document, projection) for document in documents)
+
+    def find_one(self, filter=None, projection=None, sort=None):
+        documents = list(self._match(filter))
+        for field, direction in reversed(sort or []):
+            documents.sort(key=lambda document: _sort_key(document.get(field)), reverse=direction < 0)
+        return _project(documents[0], projection) if documents else None
+
+    def find_raw_batches(self, filter=None, projection=None, batch_size=1000):
+        key = (repr(filter), repr(projection), batch_size)
+        if key not in self._raw_batches:
+            encoded = [bson.encode(_project(document, projection)) for document in self._match(filter)]
+            self._raw_batches[key] = [
+                b"".join(encoded[i:i + batch_size]) for i in range(0, len(encoded), batch_size)
+            ]
+        return iter(self._raw_batches[key])
+
+    def aggregate(self, pipeline):
+        documents = list(self.documents)
+        for stage in pipeline:
+            (operator, spec), = stage.items()
+            if operator == "$match":
+                documents = [document for document in documents if _matches(document, spec)]
+            elif operator == "$sort":
+                for field, direction in reversed(list(spec.items())):
+                    documents.sort(key=lambda document: _sort_key(document.get(field)), reverse=direction < 0)
+            elif operator == "$group":
+                groups = {}
+                for document in documents:
+                    group_id = _field_value(document, spec["_id"])
+                    if group_id not in groups:
+                        groups[group_id] = {"_id": group_id}
+                        for field, accumulator in spec.items():
+                            if field != "_id":
+                                (name, expression), = accumulator.items()
+                                if name != "$first":
+                                    raise NotImplementedError(f"Accumulator {name}")
+                                groups[group_id][field] = _field_value(document, expression)
+                documents = list(groups.values())
+            elif operator == "$project":
+                documents = [_project(document, spec) for document in documents]
+            else:
+                raise NotImplementedError(f"Stage {operator}")
+        return iter(documents)
+
+    def update_many(self, filter, update):
+        result = BulkWriteResult()
+        for document in list(self._match(filter)):
+            result.matched_count += 1
+            before = dict(document)
+            _apply(document, update, insert=False)
+            if document != before:
+                result.modified_count += 1
+        self._changed()
+        return result
+
+    def delete_many(self, filter):
+        return self._delete(filter, many=True)
+
+    def bulk_write(self, operations, ordered=True):
+        result = BulkWriteResult()
+        for operation in operations:
+            if isinstance(operation, (DeleteMany, DeleteOne)):
+                result.deleted_count += self._delete(operation._filter, isinstance(operation, DeleteMany)).deleted_count
+                continue
+            filter, update, upsert = operation._filter, operation._doc, operation._upsert
+            document = self._find_first(filter)
+            if document is None:
+                if not upsert:
+                    continue
+                document = {key: value for key, value in filter.items() if not isinstance(value, dict)}
+                _apply(document, update, insert=True)
+                self._insert(document)
+                result.upserted_count += 1
+            else:
+                result.matched_count += 1
+                before = dict(document)
+                _apply(document, update, insert=False)
+                if document != before:
+                    result.modified_count += 1
+        self._raw_batches.clear()
+        return result
+
+    def create_index(self, keys, **options):
+        return "_".join(str(key) for key in keys) if isinstance(keys, list) else str(keys)
+
+    def drop_index(self, keys):
+        pass
+
+    def _insert(self, document):
+        document.setdefault("_id", bson.ObjectId())
+        self.documents.append(document)
+        for fields, index in self._indexes.items():
+            index.setdefault(_index_key(document, fields), document)
+        self._raw_batches.clear()
+
+    def _find_first(self, filter):
+        if filter and all(not isinstance(value, dict) for value in filter.values()):
+            fields = tuple(sorted(filter))
+            if fields not in self._indexes:
+                index = {}
+                for document in self.documents:
+                    index.setdefault(_index_key(document, fields), document)
+                self._indexes[fields] = index
+            return self._indexes[fields].get(tuple(_hashable(filter[field]) for field in fields))
+        return next(self._match(filter), None)
+
+    def _match(self, filter):
+        return (document for document in self.documents if _matches(document, filter))
+
+    def _delete(self, filter, many):
+        result = BulkWriteResult()
+        kept = []
+        for document in self.documents:
+            if (many or not result.deleted_count) and _matches(document, filter):
+                result.deleted_count += 1
+            else:
+                kept.append(document)
+        self.documents = kept
+        self._changed()
+        return result
+
+    def _changed(self):
+        """Drop the hash indexes and raw batches after documents were updated or deleted in place."""
+        self._indexes.clear()
+        self._raw_batches.clear()
+
+
+class FakeCursor(list):
+    """Result of find: a list with the sort and limit methods of a pymongo cursor."""
+
+    def sort(self, key, direction=1):
+        keys = [(key, direction)] if isinstance(key, str) else key
+        for field, field_direction in reversed(keys):
+            super().sort(key=lambda document: _sort_key(document.get(field)), reverse=field_direction < 0)
+        return self
+
+    def limit(self, count):
+        return FakeCursor(self[:count]) if count else self
+
+
+class FakeDatabase:
+    """Collections created on first access, as a pymongo database."""
+
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name)
+        return self.collections[name]
+
+
+class FakeClient:
+    """Databases created on first access, as a pymongo MongoClient."""
+
+    def __init__(self, *args, **kwargs):
+        self.databases = {}
+
+    def __getitem__(self, name):
+        if name not in self.databases:
+            self.databases[name] = FakeDatabase()
+        return self.databases[name]
+
+    def close(self):
+        pass
+
+
+class BulkWriteResult:
+    def __init__(self):
+        self.matched_count = 0
+        self.modified_count = 0
+        self.upserted_count = 0
+        self.inserted_count = 0
+        self.deleted_count = 0
+
+
+def _matches(document, filter):
+    for field, condition in (filter or {}).items():
+        if field == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+            continue
+        value = document.get(field)
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$ne":
+                    if value == operand:
+                        return False
+                elif operator == "$exists":
+                    if (field in document) != bool(operand):
+                        return False
+                elif operator == "$in":
+                    if value not in operand:
+                        return False
+                elif operator in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None or not _compare(operator, value, operand):
+                        return False
+                else:
+                    raise NotImplementedError(f"Operator {operator}")
+        elif value != condition:
+            return False
+    return True
+
+
+def _compare(operator, value, operand):
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    return value <= operand
+
+
+def _apply(document, update, insert):
+    for operator, fields in update.items():
+        for field, value in fields.items():
+            if operator == "$set" or (operator == "$setOnInsert" and insert):
+                document[field] = value
+            elif operator == "$inc":
+                document[field] = document.get(field, 0) + value
+            elif operator == "$unset":
+                document.pop(field, None)
+            elif operator == "$max":
+                current = document.get(field)
+                if current is None or (value is not None and value > current):
+                    document[field] = value
+            elif operator != "$setOnInsert":
+                raise NotImplementedError(f"Update operator {operator}")
+
+
+def _project(document, projection):
+    if not projection:
+        return dict(document)
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        projected = {field: document[field] for field in included if field in document}
+        if projection.get("_id", 1) and "_id" in document:
+            projected["_id"] = document["_id"]
+        return projected
+    return {field: value for field, value in document.items() if projection.get(field, 1)}
+
+
+def _field_value(document, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    return expression
+
+
+def _sort_key(value):
+    return (value is not None, value)
+
+
+def _hashable(value):
+    return value if not isinstance(value, (list, dict)) else repr(value)
+
+
+def _index_key(document, fields):
+    return tuple(_hashable(document.get(field)) for field in fields)
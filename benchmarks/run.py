@@ -0,0 +1,364 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+import contextlib
+from datetime import datetime
+
+import pymongo
+
+benchmarks_dir = os.path.dirname(os.path.realpath(__file__))
+root_dir = os.path.join(benchmarks_dir, "..")
+sys.path[:0] = [benchmarks_dir, os.path.join(root_dir, "dashboard"), os.path.join(root_dir, "scripts")]
+
+from fake_mongo import FakeClient, FakeCollection
+from synthetic import SyntheticDataset
+
+# Parameters of the synthetic dataset at each scale (see SyntheticDataset).
+SCALES = {
+    "small": {"crude_years": 5, "forex_days": 90, "grid_points": 100, "regions": 5, "weather_days": 365},
+    "medium": {"crude_years": 20, "forex_days": 365, "grid_points": 390, "regions": 5, "weather_days": 5 * 365},
+    "large": {"crude_years": 40, "forex_days": 3 * 365, "grid_points": 1000, "regions": 20, "weather_days": 10 * 365},
+}
+
+# Render outputs of server(), with the inputs they are rendered for.
+RENDERS = [
+    ("price_plot", "all", {"selected_year": "All years", "selected_month": "All months"}),
+    ("price_plot", "year", {"selected_year": "last", "selected_month": "All months"}),
+    ("correlation_plot", "all", {"selected_region": "All regions", "selected_variable": "temperature"}),
+    ("correlation_plot", "region", {"selected_region": "Region 1", "selected_variable": "wind_speed"}),
+    ("correlation_heatmap", "window", {"selected_correlation_view": "window"}),
+    ("correlation_heatmap", "lag", {"selected_correlation_view": "lag"}),
+    ("card_forex", "all", {}),
+]
+
+# Collection names used in the fake database.
+COLLECTIONS = {
+    "CRUDE_COLLECTION_NAME": "crude_oil",
+    "FOREX_COLLECTION_NAME": "forex",
+    "WEATHER_COLLECTION_NAME": "weather",
+    "CRUDE_ROLLUP_COLLECTION_NAME": "crude_oil_rollups",
+}
+
+
+def configure_environment(work_dir):
+    """
+    Point the dashboard and the scripts to an in-process fake MongoDB and to temporary
+    directories; must run before they are imported.
+
+    Returns:
+        FakeClient: Client returned by every pymongo.MongoClient() call.
+    """
+    os.environ.update(COLLECTIONS)
+    os.environ.update({
+        "MONGO_URI": "mongodb://benchmark",
+        "DB_NAME": "benchmark",
+        "ARCHIVE_DIR": os.path.join(work_dir, "archive"),
+        "DASHBOARD_SNAPSHOT_DIR": "",
+        "DASHBOARD_STARTUP": "blocking",
+        "ARCHIVE_WARM_START": "0",
+        "REFRESH_INTERVAL": "3600",
+    })
+    client = FakeClient()
+    pymongo.MongoClient = lambda *args, **kwargs: client
+    return client
+
+
+def fill_database(db, dataset):
+    """Insert the documents of a synthetic dataset into the collections of a fake database."""
+    from crude_rollups import rebuild
+
+    db[COLLECTIONS["CRUDE_COLLECTION_NAME"]].insert_many(dataset.crude_oil_documents())
+    rebuild(db[COLLECTIONS["CRUDE_COLLECTION_NAME"]], db[COLLECTIONS["CRUDE_ROLLUP_COLLECTION_NAME"]])
+    db[COLLECTIONS["FOREX_COLLECTION_NAME"]].insert_many(dataset.forex_documents())
+    db[COLLECTIONS["WEATHER_COLLECTION_NAME"]].insert_many(dataset.weather_documents())
+
+
+def measure(function, setup=None, repeat=5):
+    """
+    Time function(setup()) 'repeat' times (setup() is not timed), then run it once more under
+    tracemalloc for its peak memory.
+
+    Returns:
+        dict: 'seconds' (min, median and mean) and 'peak_memory_bytes'.
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+
+    argument = setup() if setup else None
+    tracemalloc.start()
+    try:
+        function(argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": {"min": min(times), "median": statistics.median(times), "mean": statistics.mean(times)},
+        "peak_memory_bytes": peak,
+    }
+
+
+class BenchmarkInput:
+    """Inputs of a session, as read by the outputs of server() (input.x() and input.x.is_set())."""
+
+    def __init__(self):
+        self.values = {}
+
+    def __getattr__(self, name):
+        values = self.__dict__["values"]
+
+        class Value:
+            def __call__(self):
+                return values.get(name)
+
+            def is_set(self):
+                return name in values
+
+        return Value()
+
+
+def load_recent_forex_data_per_device(collection, devices=("SAR", "EUR", "CNY", "CAD", "NGN")):
+    """
+    Baseline of load_recent_forex_data: its former implementation, one find/sort/limit round
+    trip per hardcoded currency instead of a single $sort/$group aggregation.
+    """
+    import pandas as pd
+
+    recent_data = []
+    for device in devices:
+        recent_data.extend(list(collection.find({"device": device}).sort("last_refreshed", -1).limit(1)))
+    df = pd.DataFrame(recent_data)
+    df["last_refreshed"] = pd.to_datetime(df["last_refreshed"])
+    return df
+
+
+def benchmark_loaders(server, db, repeat):
+    """Time each load_* function of the dashboard on the collections of 'db'."""
+    crude, forex, weather, rollups = (db[name] for name in COLLECTIONS.values())
+    loaders = {
+        "load_crude_oil_data": lambda _: server.load_crude_oil_data(crude),
+        "load_crude_oil_rollups": lambda _: server.load_crude_oil_rollups(rollups),
+        "load_full_forex_data": lambda _: server.load_full_forex_data(forex),
+        "load_recent_forex_data": lambda _: server.load_recent_forex_data(forex),
+        "load_recent_forex_data[per-device baseline]": lambda _: load_recent_forex_data_per_device(forex),
+        "load_weather_data": lambda _: server.load_weather_data(weather),
+        "DataRefresher.load": lambda _: server.refresher.load(),
+    }
+    return {name: measure(loader, repeat=repeat) for name, loader in loaders.items()}
+
+
+def benchmark_renders(server, repeat):
+    """
+    Time each render output of server() on the data currently loaded by the refresher.
+    - 'cold': the shared view and figure caches are cleared before every render.
+    - 'cached': the same selection rendered again, as for a second session.
+    """
+    from shiny import reactive
+
+    session_input = BenchmarkInput()
+    outputs = {}
+
+    def output(renderer):
+        outputs[renderer.__name__] = renderer
+        return renderer
+
+    server.server(session_input, output, None)
+    loop = asyncio.new_event_loop()
+    last_year = str(server.data_service.refresher.snapshot()["crude_oil_index"].years[-1])
+
+    def render(name):
+        with reactive.isolate():
+            return str(loop.run_until_complete(outputs[name].fn()))
+
+    results = {}
+    try:
+        for name, variant, values in RENDERS:
+            session_input.values = {key: last_year if value == "last" else value for key, value in values.items()}
+            results[f"{name}[{variant}]"] = measure(
+                lambda _: render(name), setup=server.data_service.clear_caches, repeat=repeat
+            )
+            results[f"{name}[{variant}, cached]"] = measure(lambda _: render(name), repeat=repeat)
+    finally:
+        loop.close()
+    return results
+
+
+def benchmark_ingestion(dataset, work_dir, repeat, workers):
+    """Time the processing path of each summarize script, into an empty fake collection."""
+    import crude_oil_data_summarize as crude_oil
+    import forex_data_summarize as forex
+    import weather_data_summarize as weather
+    from regions import RegionClassifier
+
+    raw_dir = os.path.join(work_dir, "raw")
+    crude_file = dataset.write_crude_oil_file(os.path.join(raw_dir, "crude_oil"))
+    forex_files = dataset.write_forex_files(os.path.join(raw_dir, "forex_data"))
+    weather_files = dataset.write_weather_files(os.path.join(raw_dir, "weather"))
+    weather.REGION_CLASSIFIER = RegionClassifier(dataset.region_table())
+
+    def empty_collection():
+        # Each run starts from an empty collection and an empty archive.
+        shutil.rmtree(os.environ["ARCHIVE_DIR"], ignore_errors=True)
+        return FakeCollection()
+
+    def ingest_forex(collection):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for path in forex_files:
+                forex.process_file(collection, path)
+
+    return {
+        "crude_oil.ingest_file": measure(
+            lambda collection: crude_oil.ingest_file(collection, crude_file, FakeCollection()),
+            setup=empty_collection, repeat=repeat,
+        ),
+        "forex.process_file": measure(ingest_forex, setup=empty_collection, repeat=repeat),
+        "weather.ingest_files": measure(
+            lambda collection: weather.ingest_files(collection, weather_files, workers), setup=empty_collection, repeat=repeat
+        ),
+    }
+
+
+def run(scales, repeat=5, workers=1):
+    """
+    Run the benchmarks at each scale.
+
+    Returns:
+        dict: 'metadata' of the run and one entry of 'results' per (scale, group, name).
+    """
+    work_dir = tempfile.mkdtemp(prefix="benchmark-")
+    client = configure_environment(work_dir)
+    results = []
+    try:
+        # The dashboard loads its data at import: the first scale is in the database by then.
+        datasets = {scale: SyntheticDataset(**SCALES[scale]) for scale in scales}
+        db = client[os.environ["DB_NAME"]]
+        fill_database(db, datasets[scales[0]])
+        import server
+        logging.getLogger().setLevel(logging.WARNING)
+
+        for scale in scales:
+            dataset = datasets[scale]
+            if scale != scales[0]:
+                db = client[f"{os.environ['DB_NAME']}_{scale}"]
+                fill_database(db, dataset)
+            server.refresher.collections = {
+                "crude_oil": db[COLLECTIONS["CRUDE_COLLECTION_NAME"]],
+                "forex": db[COLLECTIONS["FOREX_COLLECTION_NAME"]],
+                "weather": db[COLLECTIONS["WEATHER_COLLECTION_NAME"]],
+                "crude_oil_rollups": db[COLLECTIONS["CRUDE_ROLLUP_COLLECTION_NAME"]],
+            }
+            groups = {
+                "loader": benchmark_loaders(server, db, repeat),
+                "render": benchmark_renders(server, repeat),
+                "ingestion": benchmark_ingestion(dataset, os.path.join(work_dir, scale), repeat, workers),
+            }
+            for group, measures in groups.items():
+                for name, result in measures.items():
+                    results.append({"scale": scale, "group": group, "name": name, **result})
+                    logging.warning(
+                        f"{scale:>6} {group:<9} {name:<40} {result['seconds']['median'] * 1000:10.1f} ms "
+                        f"{result['peak_memory_bytes'] / 2**20:8.1f} MiB"
+                    )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {"metadata": metadata(scales, repeat, workers), "results": results}
+
+
+def metadata(scales, repeat, workers):
+    """Describe the run, so that results are only compared between comparable runs."""
+    import numpy
+    import pandas
+    import plotly
+    import shiny
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": {
+            "numpy": numpy.__version__,
+            "pandas": pandas.__version__,
+            "plotly": plotly.__version__,
+            "shiny": shiny.__version__,
+        },
+        "scales": {scale: SCALES[scale] for scale in scales},
+        "repeat": repeat,
+        "workers": workers,
+    }
+
+
+# Slowdowns smaller than this (in seconds) are timer noise, whatever their ratio.
+MIN_REGRESSION_SECONDS = 0.001
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare the fastest times of two runs (the least noisy statistic).
+
+    Returns:
+        list[str]: Names of the benchmarks more than 'threshold' times slower than the baseline.
+    """
+    previous = {(r["scale"], r["group"], r["name"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = (result["scale"], result["group"], result["name"])
+        if key not in previous:
+            continue
+        seconds, previous_seconds = result["seconds"]["min"], previous[key]["seconds"]["min"]
+        ratio = seconds / max(previous_seconds, 1e-9)
+        memory = result["peak_memory_bytes"] / max(previous[key]["peak_memory_bytes"], 1)
+        regression = ratio > threshold and seconds - previous_seconds > MIN_REGRESSION_SECONDS
+        flag = "REGRESSION" if regression else ""
+        print(f"{key[0]:>6} {key[1]:<9} {key[2]:<40} time x{ratio:5.2f} memory x{memory:5.2f} {flag}")
+        if regression:
+            regressions.append("/".join(key))
+    return regressions
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard loaders, renders and the ingestion scripts.")
+    parser.add_argument("--scale", action="append", choices=list(SCALES), help="Scale(s) to run (default: small and medium).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark.")
+    parser.add_argument("--workers", type=int, default=1, help="Processes parsing the weather files.")
+    parser.add_argument("--output", help="File receiving the JSON results (default: standard output).")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with.")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio reported as a regression.")
+    args = parser.parse_args()
+
+    report = run(args.scale or ["small", "medium"], repeat=args.repeat, workers=args.workers)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,164 @@
+import os
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+# Currencies quoted against USD, as collected by the forex collector.
+DEVICES = ["SAR", "EUR", "CNY", "CAD", "NGN"]
+
+# Bounding box of the weather grid (the contiguous USA, as collector.py).
+LATITUDES = (24, 50)
+LONGITUDES = (-125, -65)
+
+
+class SyntheticDataset:
+    """
+    Deterministic synthetic data shaped like the collections and the raw files of the project.
+
+    Args:
+        crude_years (int): Years of daily crude oil prices.
+        forex_days (int): Days of forex history (one quote per device and hour).
+        grid_points (int): Number of weather grid points of a collector run.
+        regions (int): Number of weather regions, tiling the grid in longitude bands.
+        weather_days (int): Days of (region, day) weather summaries.
+        end (datetime): Last day of every series.
+        seed (int): Seed of the random generator.
+    """
+
+    def __init__(self, crude_years=5, forex_days=365, grid_points=100, regions=5, weather_days=365,
+                 end=datetime(2024, 12, 31), seed=0):
+        self.crude_years = crude_years
+        self.forex_days = forex_days
+        self.grid_points = grid_points
+        self.regions = regions
+        self.weather_days = weather_days
+        self.end = end
+        self.seed = seed
+
+    def region_table(self):
+        """Region table in the format of regions.DEFAULT_REGIONS: 'regions' longitude bands."""
+        bounds = np.linspace(LONGITUDES[0], LONGITUDES[1], self.regions + 1)
+        return [
+            (f"Region {i + 1}", LATITUDES, (float(bounds[i]), float(bounds[i + 1])))
+            for i in range(self.regions)
+        ]
+
+    def crude_oil_documents(self):
+        """Daily crude oil documents, as written by crude_oil_data_summarize.py."""
+        dates, values = self._crude_series()
+        return [
+            {"date": date, "value": float(value), "year": date.year, "month": date.month, "interpolated": False}
+            for date, value in zip(dates, values)
+        ]
+
+    def forex_documents(self):
+        """Hourly forex quotes, as written by forex_data_summarize.py (rates and dates as strings)."""
+        rng = np.random.default_rng(self.seed + 1)
+        hours = self.forex_days * 24
+        start = self.end - timedelta(hours=hours - 1)
+        documents = []
+        for k, device in enumerate(DEVICES):
+            rates = (1 + k) * np.exp(np.cumsum(rng.normal(0, 0.001, hours)))
+            documents += [
+                {
+                    "device": device,
+                    "exchange_rate": f"{rate:.5f}",
+                    "last_refreshed": (start + timedelta(hours=h)).strftime("%Y-%m-%d %H:%M:%S"),
+                }
+                for h, rate in enumerate(rates)
+            ]
+        return documents
+
+    def weather_documents(self):
+        """(region, day) aggregates, as folded by weather_data_summarize.py."""
+        rng = np.random.default_rng(self.seed + 2)
+        start = self.end - timedelta(days=self.weather_days - 1)
+        documents = []
+        for name, _, _ in self.region_table():
+            for d in range(self.weather_days):
+                count = int(rng.integers(24, 240))
+                temperature = 15 + 10 * np.sin(2 * np.pi * d / 365) + rng.normal(0, 3)
+                documents.append({
+                    "region": name,
+                    "day": start + timedelta(days=d),
+                    "temperature_count": count,
+                    "temperature_sum": float(temperature * count),
+                    "temperature_max": float(temperature + rng.uniform(2, 8)),
+                    "wind_speed_count": count,
+                    "wind_speed_sum": float(rng.uniform(5, 20) * count),
+                    "wind_speed_max": float(rng.uniform(20, 40)),
+                })
+        return documents
+
+    def write_crude_oil_file(self, directory):
+        """Write a raw crude oil file (Alpha Vantage WTI response: newest first, "." when missing)."""
+        dates, values = self._crude_series()
+        records = [
+            {"date": date.strftime("%Y-%m-%d"), "value": "." if i % 97 == 0 else f"{value:.2f}"}
+            for i, (date, value) in enumerate(zip(dates, values))
+            if date.weekday() < 5
+        ]
+        return _write_json({"name": "Crude Oil Prices WTI", "data": records[::-1]}, directory, "crude_oil_data.json")
+
+    def write_forex_files(self, directory, files=24):
+        """Write 'files' raw forex files (one Alpha Vantage quote per device each)."""
+        paths = []
+        for i in range(files):
+            refreshed = (self.end - timedelta(hours=files - i)).strftime("%Y-%m-%d %H:%M:%S")
+            data = {
+                device: {"Realtime Currency Exchange Rate": {
+                    "1. From_Currency Code": "USD",
+                    "3. To_Currency Code": device,
+                    "5. Exchange Rate": f"{(1 + k) * (1 + i / 1000):.5f}",
+                    "6. Last Refreshed": refreshed,
+                }}
+                for k, device in enumerate(DEVICES)
+            }
+            paths.append(_write_json(data, directory, f"forex_data_{i:04d}.json"))
+        return paths
+
+    def write_weather_files(self, directory, runs=4):
+        """Write 'runs' raw weather files of collector.py (24 hours of every grid point each)."""
+        rng = np.random.default_rng(self.seed + 3)
+        side = int(np.ceil(np.sqrt(self.grid_points)))
+        points = [
+            (float(lat), float(lon))
+            for lat in np.linspace(LATITUDES[0], LATITUDES[1], side)
+            for lon in np.linspace(LONGITUDES[0], LONGITUDES[1], side)
+        ][:self.grid_points]
+        paths = []
+        for run in range(runs):
+            day = self.end - timedelta(days=runs - 1 - run)
+            times = [(day + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(24)]
+            locations = [
+                {
+                    "latitude": lat,
+                    "longitude": lon,
+                    "hourly": {
+                        "time": times,
+                        "temperature_2m": np.round(rng.normal(15, 8, 24), 1).tolist(),
+                        "wind_speed_10m": np.round(rng.uniform(0, 40, 24), 1).tolist(),
+                        "cloudcover": rng.integers(0, 100, 24).tolist(),
+                    },
+                }
+                for lat, lon in points
+            ]
+            paths.append(_write_json(locations, directory, f"weather_data_{day:%Y%m%d}_{run:04d}.json"))
+        return paths
+
+    def _crude_series(self):
+        rng = np.random.default_rng(self.seed)
+        days = self.crude_years * 365
+        start = self.end - timedelta(days=days - 1)
+        values = 70 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+        return [start + timedelta(days=d) for d in range(days)], values
+
+
+def _write_json(data, directory, name):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        json.dump(data, f)
+    return path
@@ -1,5 +1,11 @@
 from shiny import App
+from starlette.routing import Route
 from ui import app_ui
 from server import server
+from metrics import metrics_enabled, metrics_endpoint
 
-app = App(app_ui, server)
\ No newline at end of file
+app = App(app_ui, server)
+
+# Prometheus scrape endpoint, ahead of the catch-all mount of the static dependencies.
+if metrics_enabled():
+    app.starlette_app.router.routes.insert(0, Route("/metrics", metrics_endpoint, methods=["GET"]))
\ No newline at end of file
@@ -0,0 +1,43 @@
+import threading
+from collections import OrderedDict
+
+from metrics import CACHE_HITS, CACHE_MISSES
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe LRU cache shared by every session.
+    Used for the derived views and the rendered figures of the data service; 'name' labels its
+    hit and miss counters.
+    """
+
+    def __init__(self, maxsize=128, name="cache"):
+        self.maxsize = maxsize
+        self.name = name
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the value cached for 'key', calling 'compute()' to build it on a miss.
+        """
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                CACHE_HITS.inc(cache=self.name)
+                return self._items[key]
+
+        CACHE_MISSES.inc(cache=self.name)
+        value = compute()
+
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Drop every cached value."""
+        with self._lock:
+            self._items.clear()
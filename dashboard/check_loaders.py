@@ -0,0 +1,110 @@
+"""
+Check the raw BSON batch decoder of loaders.py against bson.decode_all.
+
+Random batches mix the layouts the collections hold (int32 / int64 / double / null numbers,
+BSON dates and date strings, strings of every length, booleans, missing fields); each batch is
+decoded by _decode_batch and compared with the documents decoded by the BSON C extension and
+converted the same way. Run from the dashboard directory:
+
+    python check_loaders.py
+"""
+import datetime as dt
+import random
+import sys
+
+import bson
+import numpy as np
+
+from loaders import _decode_batch, _convert
+
+SCHEMA = {
+    "value": "float64",
+    "rate": "float32",
+    "date": "datetime",
+    "device": "category",
+    "interpolated": "bool",
+}
+
+EPOCH = dt.datetime(2000, 1, 1)
+
+
+def random_number(rng):
+    kind = rng.choice(["int32", "int64", "double", "null", "missing", "string"])
+    if kind == "int32":
+        return rng.randint(-2**31, 2**31 - 1)
+    if kind == "int64":
+        return bson.int64.Int64(rng.randint(-2**40, 2**40))
+    if kind == "double":
+        return rng.uniform(-1e6, 1e6)
+    if kind == "string":
+        return f"{rng.uniform(0, 100):.{rng.randint(0, 6)}f}"
+    return None if kind == "null" else ...
+
+
+def random_date(rng):
+    day = EPOCH + dt.timedelta(days=rng.randint(0, 10000), milliseconds=rng.randint(0, 86_400_000))
+    kind = rng.choice(["date", "string", "null", "missing"])
+    if kind == "date":
+        return day.replace(microsecond=day.microsecond // 1000 * 1000)
+    if kind == "string":
+        return day.strftime("%Y-%m-%d %H:%M:%S")
+    return None if kind == "null" else ...
+
+
+def random_document(rng, uniform):
+    """A document of the batch; 'uniform' documents share one layout (the fast path)."""
+    if uniform:
+        return {
+            "_id": bson.ObjectId(),
+            "value": rng.uniform(0, 100),
+            "rate": rng.uniform(0, 2),
+            "date": EPOCH + dt.timedelta(days=rng.randint(0, 10000)),
+            "device": "EUR",
+            "interpolated": rng.random() < 0.5,
+        }
+    fields = {
+        "_id": bson.ObjectId(),
+        "value": random_number(rng),
+        "rate": random_number(rng),
+        "date": random_date(rng),
+        "device": rng.choice(["", "EUR", "CAD", "NGN", "X" * rng.randint(1, 40), None, ...]),
+        "interpolated": rng.choice([True, False, None, ...]),
+        "other": rng.choice(["", "padding" * rng.randint(0, 3), ...]),
+    }
+    # Fields in a random order, '...' marking a missing field.
+    items = [(name, value) for name, value in fields.items() if value is not ...]
+    rng.shuffle(items)
+    return dict(items)
+
+
+def expected_columns(documents):
+    """The columns converted from the documents decoded by the BSON C extension."""
+    decoded = bson.decode_all(b"".join(bson.encode(document) for document in documents))
+    return {
+        field: _convert(np.array([document.get(field) for document in decoded], dtype=object), kind)
+        for field, kind in SCHEMA.items()
+    }
+
+
+def check_batch(documents):
+    batch = b"".join(bson.encode(document) for document in documents)
+    actual = _decode_batch(batch, SCHEMA)
+    expected = expected_columns(documents)
+    for field, kind in SCHEMA.items():
+        if kind == "category":
+            assert list(np.asarray(actual[field], dtype=object)) == list(np.asarray(expected[field], dtype=object)), field
+        else:
+            np.testing.assert_array_equal(actual[field], expected[field], err_msg=field)
+
+
+def main(batches=200, seed=0):
+    rng = random.Random(seed)
+    for i in range(batches):
+        size = rng.randint(1, 300)
+        uniform = i % 4 == 0
+        check_batch([random_document(rng, uniform) for _ in range(size)])
+    print(f"{batches} batches decoded like bson.decode_all.")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+
+# Rolling windows (in days) and maximum lead/lag (in days) shown by the correlation heatmap.
+WINDOWS = (30, 90, 365)
+MAX_LAG = 30
+# Minimum number of (price, exchange rate) pairs needed for a coefficient.
+MIN_PERIODS = 3
+# Minimum share of the days of a rolling window that must have a pair for its coefficient.
+MIN_WINDOW_COVERAGE = 0.5
+
+
+def forex_crude_correlation(df_crude_oil, df_forex, windows=WINDOWS, max_lag=MAX_LAG):
+    """
+    Compute the correlations between crude oil prices and the exchange rate of every device.
+    - "window": device x window grid, with the rolling correlation over each window ending on
+      the latest day (NaN if fewer than MIN_WINDOW_COVERAGE of its days have a quote) and the
+      correlation over the whole history ("All").
+    - "lag": device x lag grid, with the correlation between the crude oil price of day t and
+      the exchange rate of day t - lag (positive lags: the exchange rate leads).
+    The input frames are not modified.
+
+    Returns:
+        dict: {"window": pd.DataFrame, "lag": pd.DataFrame}, both indexed by 'Device'.
+    """
+    _, prices, rates, devices = correlation_inputs(df_crude_oil, df_forex)
+    windows = np.asarray(windows)
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    # Days long before the first quote cannot be paired with any rate, even with a lag.
+    quoted = np.flatnonzero(~np.isnan(rates).all(axis=1))
+    if len(quoted):
+        start = max(quoted[0] - max_lag, 0)
+        prices, rates = prices[start:], rates[start:]
+
+    latest = rolling_correlation(prices, rates, windows)
+    lagged = lagged_correlation(prices, rates, lags)
+    overall = lagged[lags == 0]
+
+    index = pd.Index(devices, name="Device")
+    window_grid = pd.DataFrame(
+        np.vstack([latest, overall]).T,
+        index=index,
+        columns=[f"{window}d" for window in windows] + ["All"],
+    )
+    lag_grid = pd.DataFrame(lagged.T, index=index, columns=lags)
+    return {"window": window_grid, "lag": lag_grid}
+
+
+def correlation_inputs(df_crude_oil, df_forex):
+    """
+    Align crude oil prices and exchange rates on the days of the crude oil series.
+
+    Returns:
+        tuple: (dates (T,), prices (T,), rates (T, devices) with NaN on days without a quote, devices)
+    """
+    crude = (
+        pd.DataFrame({"date": df_crude_oil["date"].dt.normalize(), "value": df_crude_oil["value"]})
+        .groupby("date")["value"].last()
+    )
+    rates = pd.pivot_table(
+        pd.DataFrame({
+            "date": df_forex["last_refreshed"].dt.normalize(),
+            "device": df_forex["device"].astype(str),
+            "exchange_rate": df_forex["exchange_rate"],
+        }),
+        index="date", columns="device", values="exchange_rate", aggfunc="last",
+    ).reindex(crude.index)
+    return (
+        crude.index.to_numpy(),
+        crude.to_numpy(dtype=float),
+        rates.to_numpy(dtype=float),
+        list(rates.columns),
+    )
+
+
+def rolling_correlation(prices, rates, windows):
+    """
+    Pearson correlation of 'prices' (T,) with every column of 'rates' (T, D) over each window
+    ending on the latest day. Only the last day is shown, so only the last 'window' days are
+    summed. A window needs at least MIN_WINDOW_COVERAGE of its days paired, so a coefficient
+    never rests on a few old quotes.
+
+    Returns:
+        np.ndarray: (windows, D) correlations.
+    """
+    return np.stack([
+        _pearson(
+            *_paired_sums(prices[-window:], rates[-window:]),
+            min_periods=max(np.ceil(window * MIN_WINDOW_COVERAGE), MIN_PERIODS),
+        )
+        for window in windows
+    ]).reshape(len(windows), rates.shape[1])
+
+
+def lagged_correlation(prices, rates, lags):
+    """
+    Pearson correlation of the price of day t with the rates of day t - lag, for every lag and
+    every device. Each lag pairs the prices with the rates shifted by slicing, so the work and
+    the memory per lag are O(T x D).
+
+    Returns:
+        np.ndarray: (lags, D) correlations over the whole history.
+    """
+    days = len(prices)
+    correlations = np.full((len(lags), rates.shape[1]), np.nan)
+    for i, lag in enumerate(lags):
+        if abs(lag) >= days:
+            continue
+        if lag >= 0:
+            x, y = prices[lag:], rates[:days - lag]
+        else:
+            x, y = prices[:days + lag], rates[-lag:]
+        correlations[i] = _pearson(*_paired_sums(x, y))
+    return correlations
+
+
+class RunningPearson:
+    """
+    Running sufficient statistics (n, Σx, Σy, Σx², Σy², Σxy) of the correlation between each
+    weather variable and the crude oil price, per region and over all regions (group None).
+    - 'add'/'remove' fold rows in or out in O(rows), so new days never trigger a rescan.
+    - 'correlation' is O(1).
+    """
+
+    def __init__(self, variables, y="value", group="region"):
+        self.variables = list(variables)
+        self.y = y
+        self.group = group
+        self.sums = {}
+
+    def copy(self):
+        """Return an independent copy (published snapshots are never modified)."""
+        other = RunningPearson(self.variables, self.y, self.group)
+        other.sums = {key: sums.copy() for key, sums in self.sums.items()}
+        return other
+
+    def add(self, df, sign=1):
+        """Fold the rows of 'df' into the statistics (or out of them with sign=-1)."""
+        if df.empty:
+            return
+        y = df[self.y].to_numpy(dtype=float)
+        groups = df[self.group].astype(str).to_numpy()
+        for variable in self.variables:
+            x = df[variable].to_numpy(dtype=float)
+            paired = ~np.isnan(x) & ~np.isnan(y)
+            x = np.where(paired, x, 0.0)
+            y_paired = np.where(paired, y, 0.0)
+            terms = pd.DataFrame({
+                "n": paired, "sx": x, "sy": y_paired,
+                "sxx": x * x, "syy": y_paired * y_paired, "sxy": x * y_paired,
+            }, dtype=float)
+            per_group = terms.groupby(groups).sum()
+            for group, sums in zip(per_group.index, per_group.to_numpy()):
+                self._add_sums((group, variable), sign * sums)
+            self._add_sums((None, variable), sign * terms.to_numpy().sum(axis=0))
+
+    def remove(self, df):
+        """Fold the rows of 'df' out of the statistics."""
+        self.add(df, sign=-1)
+
+    def correlation(self, group, variable):
+        """Return the correlation for a region (None: all regions) and a variable."""
+        sums = self.sums.get((group, variable))
+        if sums is None:
+            return np.nan
+        return float(_pearson(*(np.array([value]) for value in sums))[0])
+
+    def _add_sums(self, key, sums):
+        if key in self.sums:
+            self.sums[key] = self.sums[key] + sums
+        else:
+            self.sums[key] = sums
+
+
+def _paired_sums(prices, rates):
+    """
+    n, Σx, Σy, Σx², Σy², Σxy over the paired (price, rate) observations of each column of 'rates'.
+    The means of the pairs are subtracted first, to keep the sums of squares well conditioned.
+    """
+    x = np.broadcast_to(prices[:, None], rates.shape)
+    paired = ~np.isnan(x) & ~np.isnan(rates)
+    n = paired.sum(axis=0)
+    count = np.maximum(n, 1)
+    x = np.where(paired, x, 0.0)
+    y = np.where(paired, rates, 0.0)
+    x = np.where(paired, x - x.sum(axis=0) / count, 0.0)
+    y = np.where(paired, y - y.sum(axis=0) / count, 0.0)
+    return n, x.sum(axis=0), y.sum(axis=0), (x * x).sum(axis=0), (y * y).sum(axis=0), (x * y).sum(axis=0)
+
+
+def _pearson(n, sx, sy, sxx, syy, sxy, min_periods=MIN_PERIODS):
+    """Pearson correlation from sufficient statistics (NaN with fewer than 'min_periods' pairs or without variance)."""
+    cov = n * sxy - sx * sy
+    var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = cov / np.sqrt(var)
+    r[(n < min_periods) | ~(var > 0)] = np.nan
+    return np.clip(r, -1, 1)
+
@@ -0,0 +1,128 @@
+from shiny import reactive
+
+from cache import LRUCache
+from downsample import downsample_frame, box_stats
+
+
+class DataService:
+    """
+    Process-wide access to the dashboard data, shared by every Shiny session.
+    - 'snapshot()' is a reactive read of the current versioned snapshot published by the
+      refresher: outputs calling it are invalidated when a new version is published.
+    - The derived views (filtered frames, statistics, choices) and the rendered figures are
+      memoized by (name, arguments, data version) in caches shared by all the sessions, so
+      that a selection already made by any user is a cache lookup.
+    """
+
+    def __init__(self, refresher, view_cache_size=256, figure_cache_size=128,
+                 price_plot_max_points=1000, price_plot_min_points=250, poll_interval=1):
+        self.refresher = refresher
+        self.price_plot_max_points = price_plot_max_points
+        self.price_plot_min_points = price_plot_min_points
+        self._views = LRUCache(maxsize=view_cache_size, name="views")
+        self._figures = LRUCache(maxsize=figure_cache_size, name="figures")
+        self._version = None
+        # Created outside of any session: a single poll shared by every session.
+        self.snapshot = reactive.poll(lambda: refresher.version, poll_interval)(refresher.snapshot)
+
+    def loaded(self):
+        """Reactive: True once the refresher has published its first snapshot."""
+        return "version" in self.snapshot()
+
+    def clear_caches(self):
+        """Drop the cached views and figures (they are rebuilt on the next read)."""
+        self._views.clear()
+        self._figures.clear()
+
+    def view(self, name, args, compute):
+        """
+        Return the derived view 'name' for 'args', computing it with compute(data, *args) once
+        per data version.
+        """
+        data = self._current()
+        return self._views.get_or_compute(
+            (name, args, data["version"]), lambda: compute(data, *args)
+        )
+
+    def figure(self, name, args, render):
+        """
+        Return the HTML of the figure 'name' for 'args', rendering it with render() once per
+        data version.
+        """
+        data = self._current()
+        return self._figures.get_or_compute((name, args, data["version"]), render)
+
+    def _current(self):
+        """Read the reactive snapshot, dropping the cached values of older versions."""
+        data = self.snapshot()
+        if data["version"] != self._version:
+            self.clear_caches()
+            self._version = data["version"]
+        return data
+
+    # Derived views used by the outputs.
+
+    def years(self):
+        """Years of the crude oil series (none until the data is loaded)."""
+        if not self.loaded():
+            return []
+        return self.view("years", (), lambda data: data["crude_oil_index"].years)
+
+    def regions(self):
+        """Regions of the combined crude oil / weather data (none until the data is loaded)."""
+        if not self.loaded():
+            return []
+        return self.view("regions", (), lambda data: data["combined_by_region"].regions)
+
+    def crude_prices(self, year=None, month=None):
+        """
+        Crude oil prices of a year and/or month (None means all).
+        - The line chart reads the rollups of the coarsest resolution that still has
+          'price_plot_min_points' periods in the selection (e.g. months for decades), and the
+          daily prices when none has; either is then downsampled to 'price_plot_max_points'.
+        - The box plot does not read the rollups (see price_distribution).
+
+        Returns:
+            tuple: (every day of the selection, rows of the line chart ('date', 'value'))
+        """
+        def compute(data, year, month):
+            rows = data["crude_oil_index"].select(year=year, month=month)
+            _, rollups = data["crude_oil_rollup_index"].select(year, month, self.price_plot_min_points)
+            line = rows if rollups is None else rollups
+            return rows, downsample_frame(line, "date", "value", self.price_plot_max_points)
+        return self.view("crude_prices", (year, month), compute)
+
+    def price_distribution(self, year=None, month=None):
+        """
+        Statistics of the box plot of the crude oil prices of a year and/or month (see
+        box_stats), computed from every day of the selection once per data version. The
+        quartiles and outliers need the daily prices: the rollups, which only hold the mean,
+        open, high, low and close of each period, are never used here.
+        """
+        def compute(data, year, month):
+            return box_stats(data["crude_oil_index"].select(year=year, month=month)["value"].to_numpy())
+        return self.view("price_distribution", (year, month), compute)
+
+    def weather_prices(self, region, variable):
+        """
+        Combined crude oil / weather rows of a region (None means all) and the correlation
+        between 'variable' and the crude oil price.
+
+        Returns:
+            tuple: (rows, correlation)
+        """
+        def compute(data, region, variable):
+            rows = data["combined_by_region"].select(region)
+            return rows, data["combined_stats"].correlation(region, variable)
+        return self.view("weather_prices", (region, variable), compute)
+
+    def forex_correlation(self, view):
+        """Device x window ('window') or device x lag ('lag') correlation grid."""
+        return self.view("forex_correlation", (view,), lambda data, view: data["forex_correlation"][view])
+
+    def recent_forex(self):
+        """Latest rate of every device, as a list of records."""
+        return self.view(
+            "recent_forex", (),
+            lambda data: data["recent_forex"][["device", "exchange_rate", "last_refreshed"]].to_dict(orient="records"),
+        )
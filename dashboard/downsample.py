@@ -0,0 +1,90 @@
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    - Keeps the first and last points, splits the others into 'n_out - 2' buckets and keeps, in
+      each bucket, the point forming the largest triangle with the point kept in the previous
+      bucket and the average of the next bucket. Peaks and troughs are therefore preserved.
+
+    Args:
+        x (array-like): Sorted x values (numbers or datetime64).
+        y (array-like): y values, without NaN.
+        n_out (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Sorted positions of the points kept.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.view("int64")
+    x = x.astype(float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket i covers the points edges[i]:edges[i + 1]; the last point is a bucket of its own.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    edges = np.append(edges, n)
+    kept = np.empty(n_out, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = edges[i + 1], edges[i + 2]
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:stop] - y[a])
+            - (x[a] - x[start:stop]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def downsample_frame(df, x, y, max_points):
+    """
+    Return at most 'max_points' rows of a frame sorted by column 'x', chosen with LTTB on
+    column 'y'. The frame is returned unchanged if it is already small enough.
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+    df = df[df[y].notna()]
+    if len(df) <= max_points:
+        return df
+    return df.iloc[lttb(df[x].to_numpy(), df[y].to_numpy(), max_points)]
+
+
+def box_stats(values):
+    """
+    Summarize values for a box plot drawn from precomputed statistics (plotly go.Box with
+    q1/median/q3/...), so that only the outliers are sent instead of every value.
+    - Quartiles use linear interpolation, as Plotly's default 'quartilemethod'.
+    - The fences are the furthest values within 1.5 IQR of the box; the values beyond them
+      are the outliers.
+
+    Returns:
+        dict | None: q1, median, q3, lowerfence, upperfence, mean and outliers (np.ndarray),
+        or None without any value.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    inside = values[(values >= low) & (values <= high)]
+    return {
+        "q1": q1,
+        "median": median,
+        "q3": q3,
+        "lowerfence": inside.min(),
+        "upperfence": inside.max(),
+        "mean": values.mean(),
+        "outliers": values[(values < low) | (values > high)],
+    }
@@ -0,0 +1,77 @@
+import os
+
+import plotly
+from htmltools import HTMLDependency, tags
+from plotly.offline import get_plotlyjs_version
+
+from metrics import FIGURE_SECONDS, FIGURE_BYTES
+
+
+def plotly_js_dependency():
+    """
+    plotly.js, served once per page from the copy bundled with the plotly package.
+    Figures are then rendered with 'figure_html', which does not embed it again.
+    """
+    return HTMLDependency(
+        name="plotly",
+        version=get_plotlyjs_version(),
+        source={"subdir": os.path.join(os.path.dirname(plotly.__file__), "package_data")},
+        script={"src": "plotly.min.js"},
+    )
+
+
+def figure_html(fig, div_id=None):
+    """
+    Serialize a figure to an HTML fragment that relies on the page-level plotly.js.
+    'div_id' fixes the id of the figure's element, so that its traces can later be updated
+    with a "plotly_traces" message (see 'plotly_traces_handler').
+    """
+    with FIGURE_SECONDS.time():
+        html = fig.to_html(full_html=False, include_plotlyjs=False, div_id=div_id)
+    FIGURE_BYTES.inc(len(html.encode()))
+    return html
+
+
+
+def plotly_traces_handler():
+    """
+    Handler of the "plotly_traces" custom message: {element id: [trace update, ...]}.
+    Each update holds the new attributes (e.g. 'x' and 'y') of the trace of the same index,
+    and the figure already drawn in the element is updated in place with Plotly.react: the
+    page receives the new data only, and Plotly does not rebuild the figure.
+    """
+    return tags.script("""
+        (function() {
+            var pending = {};
+
+            function draw(id, attempts) {
+                var el = document.getElementById(id);
+                if (!el || !el.data) {
+                    // The figure of the element is not drawn yet (its output is being rendered).
+                    if (attempts > 0) {
+                        setTimeout(draw, 50, id, attempts - 1);
+                    } else {
+                        delete pending[id];
+                    }
+                    return;
+                }
+                var updates = pending[id];
+                delete pending[id];
+                var data = el.data.map(function(trace, i) {
+                    return Object.assign({}, trace, updates[i]);
+                });
+                Plotly.react(el, data, el.layout);
+            }
+
+            Shiny.addCustomMessageHandler("plotly_traces", function(message) {
+                Object.keys(message).forEach(function(id) {
+                    // Only the latest update of an element is drawn.
+                    var waiting = id in pending;
+                    pending[id] = message[id];
+                    if (!waiting) {
+                        draw(id, 100);
+                    }
+                });
+            });
+        })();
+    """)
@@ -0,0 +1,232 @@
+import struct
+
+import bson
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from metrics import QUERY_SECONDS, QUERY_BYTES
+
+
+# Columns loaded for each collection, with the type they are decoded to.
+# - "datetime": BSON dates or date strings, stored as datetime64[ns].
+# - "float32" / "float64": BSON numbers or numeric strings.
+# - "category": strings with few distinct values (regions, currencies).
+# - "bool": BSON booleans, False when the field is missing.
+CRUDE_OIL_SCHEMA = {"date": "datetime", "value": "float64", "interpolated": "bool"}
+FOREX_SCHEMA = {"device": "category", "exchange_rate": "float64", "last_refreshed": "datetime"}
+# Rollups of the crude oil prices per week, month and year (see scripts/crude_rollups.py).
+CRUDE_ROLLUP_SCHEMA = {
+    "resolution": "category", "period": "datetime", "last_date": "datetime",
+    "open": "float64", "high": "float64", "low": "float64", "close": "float64",
+    "mean": "float64", "count": "float64",
+}
+# Weather documents hold mergeable daily aggregates (count, sum and max of each variable);
+# 'temperature' and 'wind_speed' are the mean and max of summaries written before them.
+WEATHER_SCHEMA = {
+    "region": "category", "day": "datetime",
+    "temperature_count": "float64", "temperature_sum": "float64", "wind_speed_max": "float32",
+    "temperature": "float32", "wind_speed": "float32",
+}
+
+# BSON element types that have a fixed-size payload, and the matching NumPy type.
+_FIXED_SIZE_TYPES = {
+    0x01: "<f8",  # double
+    0x08: "?",    # boolean
+    0x09: "<i8",  # UTC datetime, milliseconds since the epoch
+    0x10: "<i4",  # int32
+    0x12: "<i8",  # int64
+}
+_STRING_TYPE = 0x02
+_INT32 = struct.Struct("<i")
+
+
+def load_columns(collection, schema, query=None):
+    """
+    Load the fields of 'schema' from a MongoDB collection into a DataFrame of typed columns.
+    - Only the fields of the schema are requested (projection), '_id' is left out.
+    - Documents are fetched as raw BSON batches (find_raw_batches) and decoded batch by batch.
+    - Returns an empty DataFrame with the schema's columns if no document matches.
+    - The query and decoding time and the bytes received are recorded per collection.
+    """
+    projection = {field: 1 for field in schema}
+    projection["_id"] = 0
+
+    batches = {field: [] for field in schema}
+    with QUERY_SECONDS.time(collection=collection.name):
+        for batch in collection.find_raw_batches(query, projection):
+            QUERY_BYTES.inc(len(batch), collection=collection.name)
+            for field, values in _decode_batch(batch, schema).items():
+                batches[field].append(values)
+
+    return pd.DataFrame({
+        field: _concat_column(batches[field], kind) for field, kind in schema.items()
+    })
+
+
+def load_archive(archive, dataset, schema, start=None, end=None):
+    """
+    Load the fields of 'schema' from the columnar archive written by the summarize scripts
+    (scripts/archive.py) into a DataFrame typed like 'load_columns'.
+    - The partitions between 'start' and 'end' are memory-mapped, MongoDB is not queried.
+    - Fields the archive does not hold (e.g. the legacy weather means) are left empty.
+    """
+    df = archive.read(dataset, start, end)
+    columns = {}
+    for field, kind in schema.items():
+        values = df[field].to_numpy() if field in df else np.full(len(df), np.nan)
+        columns[field] = _convert(values, kind)
+    return pd.DataFrame(columns)
+
+
+def concat_frames(frames):
+    """Concatenate frames loaded by 'load_columns', keeping categorical columns categorical."""
+    df = pd.concat(frames, ignore_index=True)
+    for column in frames[0].select_dtypes("category").columns:
+        if df[column].dtype != "category":
+            df[column] = union_categoricals([f[column] for f in frames], ignore_order=True)
+    return df
+
+
+def _decode_batch(batch, schema):
+    """
+    Decode one raw batch into a dict of arrays, one per field of 'schema'.
+
+    Documents of the same size almost always share the same layout (same fields, same types,
+    same string lengths): each group of same-size documents is viewed as a NumPy structured
+    array and its columns are read without decoding any document. Groups whose layout differs
+    between documents fall back to the BSON C extension.
+    """
+    buffer = np.frombuffer(batch, dtype=np.uint8)
+    sizes = _document_sizes(batch)
+    if (sizes == sizes[0]).all():
+        return _decode_rows(buffer.reshape(-1, sizes[0]), schema)
+
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    groups, parts = [], []
+    for size in np.unique(sizes):
+        index = np.flatnonzero(sizes == size)
+        rows = buffer[starts[index, None] + np.arange(size)]
+        groups.append(index)
+        parts.append(_decode_rows(rows, schema))
+
+    # Put the documents back in the order of the batch.
+    order = np.argsort(np.concatenate(groups), kind="stable")
+    return {
+        field: _concat_column([part[field] for part in parts], kind)[order]
+        for field, kind in schema.items()
+    }
+
+
+def _document_sizes(batch):
+    """Return the size in bytes of each document of a raw batch."""
+    sizes = []
+    append = sizes.append
+    unpack = _INT32.unpack_from
+    pos, end = 0, len(batch)
+    while pos < end:
+        (size,) = unpack(batch, pos)
+        append(size)
+        pos += size
+    return np.array(sizes)
+
+
+def _decode_rows(rows, schema):
+    """Decode a 2D array of same-size BSON documents (one per row) into typed columns."""
+    layout = _fixed_layout(rows[0].tobytes())
+    if layout is not None:
+        offsets, header = layout
+        if (rows[:, header] == rows[0, header]).all():
+            size = rows.shape[1]
+            columns = {}
+            for field, kind in schema.items():
+                if field in offsets:
+                    offset, fmt = offsets[field]
+                    values = np.ndarray(len(rows), dtype=fmt, buffer=rows, offset=offset, strides=(size,))
+                    columns[field] = _convert(values, kind, fmt)
+                else:
+                    columns[field] = _convert(np.full(len(rows), None, dtype=object), kind)
+            return columns
+
+    docs = bson.decode_all(rows.tobytes())
+    return {
+        field: _convert(np.array([doc.get(field) for doc in docs], dtype=object), kind)
+        for field, kind in schema.items()
+    }
+
+
+def _fixed_layout(document):
+    """
+    Read the layout of a single BSON document.
+
+    Returns:
+        tuple | None: ({field: (offset, numpy format)}, positions of the bytes that must be
+        identical in every document sharing this layout), or None if the document contains
+        an element whose type is not supported.
+    """
+    offsets = {}
+    header = list(range(4))
+    pos = 4
+    while document[pos] != 0:
+        element_type = document[pos]
+        name_end = document.index(b"\x00", pos + 1)
+        name = document[pos + 1:name_end].decode()
+        header.extend(range(pos, name_end + 1))
+        pos = name_end + 1
+
+        if element_type in _FIXED_SIZE_TYPES:
+            fmt = _FIXED_SIZE_TYPES[element_type]
+            offsets[name] = (pos, fmt)
+            pos += np.dtype(fmt).itemsize
+        elif element_type == _STRING_TYPE:
+            # int32 length (including the trailing null byte), then the characters.
+            length = int.from_bytes(document[pos:pos + 4], "little")
+            if length <= 1:
+                return None
+            header.extend(range(pos, pos + 4))
+            offsets[name] = (pos + 4, f"S{length - 1}")
+            pos += 4 + length
+        else:
+            return None
+    header.append(pos)
+    return offsets, np.array(header)
+
+
+def _convert(values, kind, fmt=None):
+    """Convert the raw values of one batch to the column type 'kind'."""
+    if kind == "datetime":
+        if fmt == "<i8":
+            return values.astype("datetime64[ms]").astype("datetime64[ns]")
+        if values.dtype.kind == "S":
+            values = values.astype(str)
+        return pd.to_datetime(values, errors="coerce").to_numpy(dtype="datetime64[ns]")
+    if kind in ("float32", "float64"):
+        if values.dtype.kind in "fiub":
+            return values.astype(kind)
+        if values.dtype.kind == "S":
+            values = values.astype(str)
+        return pd.to_numeric(values, errors="coerce").astype(kind)
+    if kind == "bool":
+        if values.dtype.kind in "biuf":
+            return np.nan_to_num(values.astype(float)) != 0
+        return np.array([value is not None and bool(value) for value in values], dtype=bool)
+    if kind == "category":
+        if values.dtype.kind == "S":
+            values = values.astype(str)
+        categorical = pd.Categorical(values)
+        if not len(categorical.categories):
+            # Without any value, the categories must still be strings to be concatenated.
+            categorical = pd.Categorical(values, categories=pd.Index([], dtype=str))
+        return categorical
+    raise ValueError(f"Unknown column type: {kind}")
+
+
+def _concat_column(chunks, kind):
+    """Concatenate the per-batch arrays of one column."""
+    if kind == "category":
+        if not chunks:
+            return pd.Categorical([])
+        return union_categoricals(chunks, ignore_order=True)
+    if not chunks:
+        return np.array([], dtype="datetime64[ns]" if kind == "datetime" else kind)
+    return np.concatenate(chunks)
@@ -0,0 +1,174 @@
+import os
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+
+from starlette.responses import PlainTextResponse
+
+
+# Upper bounds (seconds) of the histogram buckets, from a cached lookup to a full reload.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Registry:
+    """Metrics of the process, rendered in the Prometheus text format by 'exposition'."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        lines = []
+        for metric in self.metrics:
+            lines += [f"# HELP {metric.name} {metric.documentation}", f"# TYPE {metric.name} {metric.kind}"]
+            lines += metric.samples()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+@functools.cache
+def metrics_enabled():
+    """
+    Collect the metrics and serve them on /metrics (DASHBOARD_METRICS, "1" by default). When
+    disabled, the instrumented outputs are left undecorated and the metrics methods return
+    immediately. Read on first use rather than at import, so that the value set in the .env file
+    loaded by server.py is used.
+    """
+    return os.getenv("DASHBOARD_METRICS", "1") == "1"
+
+
+class Counter:
+    """Monotonic counter per label values (e.g. payload bytes, cache hits)."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        if not metrics_enabled():
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Distribution of durations per label values, with cumulative buckets, sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        if not metrics_enabled():
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, then +Inf, then the sum.
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bucket] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the 'with' block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        lines = []
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+RENDER_SECONDS = Histogram("dashboard_render_seconds", "Time spent rendering a Shiny output.", ["output"])
+RENDER_BYTES = Counter("dashboard_render_bytes_total", "HTML bytes sent by the Shiny outputs.", ["output"])
+QUERY_SECONDS = Histogram("dashboard_query_seconds", "Time spent querying MongoDB and decoding the results.", ["collection"])
+QUERY_BYTES = Counter("dashboard_query_bytes_total", "BSON bytes received from MongoDB.", ["collection"])
+FIGURE_SECONDS = Histogram("dashboard_figure_serialization_seconds", "Time spent serializing a Plotly figure to HTML.")
+FIGURE_BYTES = Counter("dashboard_figure_bytes_total", "HTML bytes of the serialized Plotly figures.")
+CACHE_HITS = Counter("dashboard_cache_hits_total", "Lookups served from a shared cache.", ["cache"])
+CACHE_MISSES = Counter("dashboard_cache_misses_total", "Lookups computed and stored in a shared cache.", ["cache"])
+
+
+def instrument_output(renderer):
+    """
+    Decorator of a Shiny output, placed between @output and @render.ui: observes the time
+    spent computing and rendering the output in RENDER_SECONDS, and counts the UTF-8 bytes of
+    the HTML sent to the browser in RENDER_BYTES.
+    """
+    if not metrics_enabled():
+        return renderer
+    output = renderer.__name__
+    render = renderer.render
+
+    @functools.wraps(render)
+    async def instrumented_render():
+        with RENDER_SECONDS.time(output=output):
+            rendered = await render()
+        if rendered is not None:
+            RENDER_BYTES.inc(len(rendered["html"].encode()), output=output)
+        return rendered
+
+    renderer.render = instrumented_render
+    return renderer
+
+
+async def metrics_endpoint(request):
+    """Starlette endpoint serving REGISTRY in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.exposition(), media_type="text/plain; version=0.0.4")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
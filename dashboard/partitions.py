@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+
+class PartitionIndex:
+    """
+    Year/month partition index over a daily DataFrame.
+    - Keeps two read-only copies of the frame: one sorted by date, where every year and every
+      (year, month) is a contiguous block of rows, and one sorted by (month, date), where every
+      month of all the years is a contiguous block.
+    - 'select' then returns any year/month combination as a slice of one of them: no copy and
+      no scan of the frame.
+    """
+
+    def __init__(self, df, date_column="date"):
+        dates = df[date_column]
+        by_date = df.iloc[np.argsort(dates.to_numpy(), kind="stable")].reset_index(drop=True)
+        dates = by_date[date_column]
+        by_month = by_date.iloc[np.argsort(dates.dt.month.to_numpy(), kind="stable")].reset_index(drop=True)
+
+        self.by_date = _read_only(by_date)
+        self.by_month = _read_only(by_month)
+        self.years = [int(year) for year in sorted(dates.dt.year.dropna().unique())]
+
+        years = dates.dt.year.to_numpy()
+        months = dates.dt.month.to_numpy()
+        self._year_ranges = _ranges(years)
+        self._year_month_ranges = _ranges(years * 100 + months)
+        self._month_ranges = _ranges(by_month[date_column].dt.month.to_numpy())
+
+    def select(self, year=None, month=None):
+        """
+        Return the rows of a year and/or a month (None means all of them) as a read-only view.
+        """
+        if year is None and month is None:
+            return self.by_date
+        if year is None:
+            return _slice(self.by_month, self._month_ranges.get(month))
+        if month is None:
+            return _slice(self.by_date, self._year_ranges.get(year))
+        return _slice(self.by_date, self._year_month_ranges.get(year * 100 + month))
+
+
+class RegionPartitions:
+    """
+    Frame split into one contiguous, read-only block of rows per region (sorted by region, then
+    date), so that selecting a region is a slice instead of a copy and a boolean mask.
+    """
+
+    def __init__(self, df, region_column="region", date_column="date"):
+        regions = df[region_column].astype(str).to_numpy()
+        order = np.lexsort((df[date_column].to_numpy(), regions))
+        self.frame = _read_only(df.iloc[order].reset_index(drop=True))
+
+        values, starts = np.unique(regions[order], return_index=True)
+        stops = np.append(starts[1:], len(order))
+        self.regions = [str(value) for value in values]
+        self._ranges = {
+            str(value): (int(start), int(stop)) for value, start, stop in zip(values, starts, stops)
+        }
+
+    def select(self, region=None):
+        """Return the rows of a region (None means all of them) as a read-only view."""
+        if region is None:
+            return self.frame
+        return _slice(self.frame, self._ranges.get(region))
+
+
+class RollupIndex:
+    """
+    Weekly, monthly and yearly rollups of the crude oil prices (see scripts/crude_rollups.py),
+    with one year/month PartitionIndex per resolution, keyed by the first day of each period
+    ('date') and holding the mean price of the period as 'value'.
+    - A resolution is only used if its rollups cover every day with a price of the daily frame
+      (the sum of their counts is the number of those days), e.g. not until they are backfilled.
+    """
+
+    # Resolutions, from the coarsest.
+    RESOLUTIONS = ["year", "month", "week"]
+
+    def __init__(self, rollups, daily):
+        """
+        Args:
+            rollups (pd.DataFrame | None): Rollup documents ('resolution', 'period', 'mean', 'count', ...).
+            daily (pd.DataFrame): Daily prices ('date', 'value').
+        """
+        self.indexes = {}
+        if rollups is None or rollups.empty:
+            return
+        days = int(daily["value"].notna().sum())
+        resolutions = rollups["resolution"].astype(str).to_numpy()
+        for resolution in self.RESOLUTIONS:
+            rows = rollups[resolutions == resolution]
+            if rows.empty or int(rows["count"].sum()) != days:
+                continue
+            self.indexes[resolution] = PartitionIndex(rows.rename(columns={"period": "date", "mean": "value"}))
+
+    def select(self, year=None, month=None, min_points=1):
+        """
+        Return the rollups of a year and/or a month at the coarsest resolution that has at least
+        'min_points' periods in the selection.
+
+        Returns:
+            tuple: (resolution, read-only rows), or (None, None) if no resolution has enough
+            periods: the daily prices are then used.
+        """
+        for resolution, index in self.indexes.items():
+            rows = index.select(year=year, month=month)
+            if len(rows) >= min_points:
+                return resolution, rows
+        return None, None
+
+
+def _ranges(keys):
+    """Map each value of a sorted key array to the (start, stop) range of rows holding it."""
+    values, starts = np.unique(keys, return_index=True)
+    stops = np.append(starts[1:], len(keys))
+    return {
+        int(value): (int(start), int(stop))
+        for value, start, stop in zip(values, starts, stops)
+        if not np.isnan(value)
+    }
+
+
+def _slice(df, bounds):
+    """Return the rows between 'bounds' (an empty frame if there are none)."""
+    start, stop = bounds if bounds is not None else (0, 0)
+    return df.iloc[start:stop]
+
+
+def _read_only(df):
+    """Rebuild a frame on read-only arrays, so that the rows shared by every session cannot be modified."""
+    columns = {}
+    for column in df.columns:
+        if isinstance(df[column].dtype, np.dtype):
+            values = df[column].to_numpy().copy()
+            values.flags.writeable = False
+            columns[column] = values
+        else:
+            columns[column] = df[column].array
+    return pd.DataFrame(columns, copy=False)
@@ -0,0 +1,264 @@
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from loaders import concat_frames
+from snapshot import save_snapshot
+from partitions import PartitionIndex, RegionPartitions, RollupIndex
+from correlation import forex_crude_correlation, RunningPearson
+
+# Weather variables correlated with the crude oil price in 'combined'.
+WEATHER_VARIABLES = ["temperature", "wind_speed"]
+
+
+class DataRefresher:
+    """
+    Keep the dashboard DataFrames in sync with MongoDB without restarting the app.
+    - Polls each collection with a high-water mark on its date field ('date' for crude oil,
+      'last_refreshed' for forex, 'day' for weather) and only fetches documents at or after it.
+    - The tail of each frame starting at the high-water mark is replaced by the fetched rows,
+      so documents rewritten for the most recent day are picked up as well as new ones.
+    - The crude oil days after the last observed price are interpolated, and the summarize script
+      rewrites them when observed prices arrive: the high-water mark of crude oil and of its
+      rollups is moved back to the first of them (see 'first_rewritable_day').
+    - 'combined' is only re-merged for the dates that changed. It is published split by region
+      ('combined_by_region', a RegionPartitions) with running Pearson statistics per region and
+      weather variable ('combined_stats'), updated with the changed rows only.
+    - 'crude_oil_index' (a year/month PartitionIndex of 'crude_oil') is rebuilt here, off the
+      Shiny event loop, whenever the crude oil frame changes. So is 'crude_oil_rollup_index' (a
+      RollupIndex of the optional 'crude_oil_rollups' collection) when either frame changes.
+    - 'forex_correlation' is computed here once per data version, whenever the crude oil or the
+      forex frame changes; the heatmap only reads it.
+    - 'version' is bumped after every change and published with the frames (frames["version"]);
+      the Shiny app polls it to invalidate its outputs and uses it in its cache keys. It stays 0
+      (and the frames empty) until the first load or restore.
+    - The loaded frames are saved to 'snapshot_dir' after every change (see snapshot.py), so that
+      a restart can 'restore' them from local disk and reconcile with MongoDB afterwards.
+    """
+
+    def __init__(self, collections, loaders, interval=60, snapshot_dir=None):
+        """
+        Args:
+            collections (dict): MongoDB collections keyed by 'crude_oil', 'forex' and 'weather', and
+                optionally 'crude_oil_rollups'.
+            loaders (dict): Functions (collection, query) -> DataFrame keyed like 'collections',
+                plus 'recent_forex', a function (collection) -> DataFrame of the latest rates.
+            interval (float): Number of seconds between two polls.
+            snapshot_dir (str | None): Directory of the snapshot of the loaded frames (None: no snapshot).
+        """
+        self.collections = collections
+        self.loaders = loaders
+        self.interval = interval
+        self.snapshot_dir = snapshot_dir
+        self.version = 0
+        self.frames = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Field used as high-water mark in MongoDB, and matching column in the loaded frame.
+    HWM_FIELDS = {
+        "crude_oil": ("date", "date"),
+        "forex": ("last_refreshed", "last_refreshed"),
+        "weather": ("day", "date"),
+        "crude_oil_rollups": ("last_date", "last_date"),
+    }
+
+    def load(self, loaders=None):
+        """
+        Run the initial full load of every collection, the loaders running concurrently.
+
+        Args:
+            loaders (dict | None): Functions used instead of 'self.loaders' for this load only,
+                with the same keys and signatures (e.g. reading the columnar archive for a warm
+                start); the polls then fetch from MongoDB what they are missing.
+        """
+        loaders = loaders or self.loaders
+        with ThreadPoolExecutor(max_workers=len(self.HWM_FIELDS) + 1, thread_name_prefix="data-load") as pool:
+            futures = {
+                name: pool.submit(loaders[name], self.collections[name], None)
+                for name in self.HWM_FIELDS if name in self.collections
+            }
+            futures["recent_forex"] = pool.submit(loaders["recent_forex"], self.collections["forex"])
+            frames = {name: future.result() for name, future in futures.items()}
+        self._publish_loaded(frames)
+
+    def restore(self, frames):
+        """
+        Publish frames saved in a snapshot (see snapshot.py), instead of loading them; the polls
+        then fetch from MongoDB what they are missing.
+        """
+        self._publish_loaded(frames, save=False)
+
+    def _publish_loaded(self, frames, save=True):
+        """Derive the frames computed from the loaded ones and publish them all."""
+        frames = dict(frames)
+        frames["combined"] = pd.merge(frames["crude_oil"], frames["weather"], on="date", how="inner")
+        frames["combined_by_region"] = RegionPartitions(frames["combined"])
+        frames["combined_stats"] = RunningPearson(WEATHER_VARIABLES)
+        frames["combined_stats"].add(frames["combined"])
+        frames["crude_oil_index"] = PartitionIndex(frames["crude_oil"])
+        frames["crude_oil_rollup_index"] = RollupIndex(frames.get("crude_oil_rollups"), frames["crude_oil"])
+        frames["forex_correlation"] = forex_crude_correlation(frames["crude_oil"], frames["forex"])
+        self._publish(frames, save)
+
+    def _publish(self, frames, save=True):
+        with self._lock:
+            self.version += 1
+            frames["version"] = self.version
+            self.frames = frames
+        if save and self.snapshot_dir:
+            try:
+                save_snapshot(frames, self.snapshot_dir)
+            except Exception as e:
+                logging.error(f"Failed to save the dashboard snapshot: {e}")
+
+    def snapshot(self):
+        """Return the current frames; the dict is never mutated once published."""
+        with self._lock:
+            return self.frames
+
+    def high_water_mark(self, name):
+        """Return the last value of the date field loaded for a collection, or None."""
+        field, column = self.HWM_FIELDS[name]
+        df = self.frames.get(name)
+        if df is None or df.empty or column not in df.columns:
+            return None
+        hwm = df[column].max()
+        if pd.isna(hwm):
+            return None
+        if name in ("crude_oil", "crude_oil_rollups"):
+            rewritable = self.first_rewritable_day()
+            if rewritable is not None:
+                hwm = min(hwm, rewritable)
+        if field == "last_refreshed":
+            # Forex timestamps are stored as "YYYY-MM-DD HH:MM:SS" strings in MongoDB.
+            return hwm.strftime("%Y-%m-%d %H:%M:%S")
+        return hwm.to_pydatetime()
+
+    def first_rewritable_day(self):
+        """
+        Return the first loaded crude oil day after the last observed one, or None. The summarize
+        script only writes the days after the last observed one (see load_anchor): those days, and
+        the rollups of the periods holding them (whose 'last_date' is not before them), are the
+        only ones that can change besides new ones.
+        """
+        df = self.frames.get("crude_oil")
+        if df is None or "interpolated" not in df.columns:
+            return None
+        observed = df.loc[~df["interpolated"], "date"].max()
+        if pd.isna(observed):
+            return None
+        filled = df.loc[df["date"] > observed, "date"]
+        return None if filled.empty else filled.min()
+
+    def refresh_once(self):
+        """
+        Fetch the documents at or after each high-water mark and publish the updated frames.
+
+        Returns:
+            bool: True if any frame changed.
+        """
+        frames = dict(self.snapshot())
+        changed = set()
+        changed_dates = []
+
+        for name, (field, column) in self.HWM_FIELDS.items():
+            if name not in self.collections:
+                continue
+            hwm = self.high_water_mark(name)
+            query = {field: {"$gte": hwm}} if hwm is not None else None
+            try:
+                new_rows = self.loaders[name](self.collections[name], query)
+            except ValueError:
+                # The loaders raise on an empty result: nothing new for this collection.
+                continue
+            if new_rows.empty:
+                continue
+
+            old = frames.get(name)
+            if old is None:
+                # First rows of an optional collection (e.g. rollups of a snapshot saved without them).
+                old = new_rows.iloc[:0]
+            elif hwm is not None:
+                is_tail = old[column] >= pd.Timestamp(hwm)
+                tail = old[is_tail].reset_index(drop=True)
+                if tail.equals(new_rows.astype(tail.dtypes.to_dict())):
+                    # Only the rows at the high-water mark came back, unchanged.
+                    continue
+                old = old[~is_tail]
+            frames[name] = concat_frames([old, new_rows])
+            changed.add(name)
+
+            if name == "forex":
+                frames["recent_forex"] = self.loaders["recent_forex"](self.collections["forex"])
+            elif name != "crude_oil_rollups":
+                changed_dates.append(new_rows["date"].min())
+            if name == "crude_oil":
+                frames["crude_oil_index"] = PartitionIndex(frames["crude_oil"])
+
+        if not changed:
+            return False
+
+        if {"crude_oil", "crude_oil_rollups"} & changed:
+            frames["crude_oil_rollup_index"] = RollupIndex(frames.get("crude_oil_rollups"), frames["crude_oil"])
+
+        if {"crude_oil", "forex"} & changed:
+            frames["forex_correlation"] = forex_crude_correlation(frames["crude_oil"], frames["forex"])
+
+        if changed_dates:
+            start = min(changed_dates)
+            combined = frames["combined"]
+            kept = combined[combined["date"] < start]
+            crude = frames["crude_oil"]
+            weather = frames["weather"]
+            merged = pd.merge(
+                crude[crude["date"] >= start],
+                weather[weather["date"] >= start],
+                on="date",
+                how="inner",
+            )
+            frames["combined"] = concat_frames([kept, merged])
+            frames["combined_by_region"] = RegionPartitions(frames["combined"])
+
+            stats = frames["combined_stats"].copy()
+            stats.remove(combined[combined["date"] >= start])
+            stats.add(merged)
+            frames["combined_stats"] = stats
+
+        self._publish(frames)
+        return True
+
+    def _run(self, immediate):
+        if immediate:
+            self._refresh()
+        while not self._stop.wait(self.interval):
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            if self.refresh_once():
+                logging.info(f"Dashboard data refreshed (version {self.version}).")
+        except Exception as e:
+            logging.error(f"Failed to refresh dashboard data: {e}")
+
+    def start(self, immediate=False):
+        """
+        Start polling MongoDB in a daemon thread.
+
+        Args:
+            immediate (bool): Poll right away instead of after the first interval (to reconcile
+                a warm start with MongoDB).
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, args=(immediate,), name="data-refresher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop the polling thread."""
+        self._stop.set()
+
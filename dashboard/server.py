@@ -7,9 +7,25 @@ import plotly.graph_objects as go
 import pandas as pd
 import seaborn as sns
 import numpy as np
+import bson
 from dotenv import load_dotenv
 import os
 import sys
+import time
+import logging
+import threading
+from refresh import DataRefresher
+from snapshot import load_snapshot
+from loaders import load_columns, load_archive, CRUDE_OIL_SCHEMA, CRUDE_ROLLUP_SCHEMA, FOREX_SCHEMA, WEATHER_SCHEMA
+from figures import figure_html
+from metrics import instrument_output, metrics_enabled, QUERY_SECONDS, QUERY_BYTES
+from data_service import DataService
+
+# Modules shared with the summarize scripts.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from mongo_indexes import ensure_indexes
+from archive import Archive, DATASETS
+from crude_rollups import compute_rollups
 
 # Load environment variables from the scripts/.env file
 dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', '.env')
@@ -20,84 +36,258 @@ db_name =  os.getenv("DB_NAME")
 crude_oil = os.getenv("CRUDE_COLLECTION_NAME")
 weather = os.getenv("WEATHER_COLLECTION_NAME")
 forex = os.getenv("FOREX_COLLECTION_NAME")
+# Weekly, monthly and yearly rollups of the crude oil prices, written by the crude oil summarize
+# script (optional: without them, the line chart downsamples the daily prices).
+crude_oil_rollups = os.getenv("CRUDE_ROLLUP_COLLECTION_NAME")
 
 client = MongoClient(mongo_uri)
 db = client[db_name]
 
+# Maximum number of points drawn by the crude oil price line chart (about one per pixel).
+PRICE_PLOT_MAX_POINTS = int(os.getenv("PRICE_PLOT_MAX_POINTS", 1000))
+# The line chart uses the coarsest rollups that still have this many periods in the selection.
+PRICE_PLOT_MIN_POINTS = int(os.getenv("PRICE_PLOT_MIN_POINTS", 250))
+
+# Number of rendered figures and of derived views kept in memory and shared by every session.
+FIGURE_CACHE_SIZE = int(os.getenv("FIGURE_CACHE_SIZE", 128))
+VIEW_CACHE_SIZE = int(os.getenv("VIEW_CACHE_SIZE", 256))
+
+# Start from the columnar archive written by the summarize scripts instead of loading every
+# collection from MongoDB; the first poll, run right away, fetches what the archive is missing.
+ARCHIVE_WARM_START = os.getenv("ARCHIVE_WARM_START", "0") == "1"
+archive = Archive()
+
+# "blocking": the data is loaded before the app serves its first request. "background": the app
+# serves placeholders right away while the data is restored from the snapshot or loaded.
+DASHBOARD_STARTUP = os.getenv("DASHBOARD_STARTUP", "blocking")
+# Snapshot of the last loaded frames, saved after every change (empty: no snapshot).
+SNAPSHOT_DIR = os.getenv(
+    "DASHBOARD_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'snapshot')
+)
+# Draw the crude oil price figures once per session (and data version), and send the traces of
+# the later selections to the browser, which updates the figures in place with Plotly.react.
+PERSISTENT_FIGURES = os.getenv("PERSISTENT_FIGURES", "0") == "1"
+
+# Number of seconds between two attempts of the initial load in background mode.
+STARTUP_RETRY_DELAY = float(os.getenv("STARTUP_RETRY_DELAY", 5))
+
 collection_crude_oil = db[crude_oil ]
 collection_forex = db[forex]
 collection_weather = db[weather]
+collection_crude_oil_rollups = db[crude_oil_rollups] if crude_oil_rollups else None
 
-def load_crude_oil_data(collection):
+def load_crude_oil_data(collection, query=None):
     """
     Load crude oil price data from the specified MongoDB collection.
-    - Converts the 'date' column to datetime and extracts the 'year' and 'month' columns.
+    - Loads the 'date' (datetime) and 'value' columns and extracts the 'year' and 'month' columns.
+    - 'query' optionally restricts the documents loaded (used for incremental refreshes).
     - Returns a DataFrame containing the crude oil price data.
     """
-    data = list(collection.find())
-    df = pd.DataFrame(data)
-    
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    return crude_oil_frame(load_columns(collection, CRUDE_OIL_SCHEMA, query))
+
+def crude_oil_frame(df):
+    """Add the 'year' and 'month' columns to the crude oil prices."""
     df["year"] = df["date"].dt.year  
     df["month"] = df["date"].dt.month
     return df
 
+def load_crude_oil_rollups(collection, query=None):
+    """
+    Load the rollups of the crude oil prices (one row per resolution and period).
+    'query' optionally restricts the documents loaded (used for incremental refreshes).
+    """
+    return load_columns(collection, CRUDE_ROLLUP_SCHEMA, query)
+
+def archived_crude_oil_rollups():
+    """Rollups of the archived crude oil prices, computed as the summarize script does."""
+    rollups = compute_rollups(load_archive(archive, "crude_oil", CRUDE_OIL_SCHEMA))
+    types = {"category": "category", "datetime": "datetime64[ns]"}
+    rollups = rollups.astype({field: types.get(kind, kind) for field, kind in CRUDE_ROLLUP_SCHEMA.items()})
+    return rollups[list(CRUDE_ROLLUP_SCHEMA)]
+
 def load_recent_forex_data(collection):
     """
-    Load the most recent Forex data for the given devices.
+    Load the most recent Forex data of every device present in the collection.
+    - A single $sort/$group aggregation, backed by the (device, last_refreshed) index.
     """
-    recent_data = []
-    devices = ["SAR", "EUR", "CNY", "CAD", "NGN"]
-    for device in devices:
-        data = collection.find({"device": device}).sort("last_refreshed", -1).limit(1)
-        recent_data.extend(list(data))
+    with QUERY_SECONDS.time(collection=collection.name):
+        recent_data = list(collection.aggregate([
+            {"$sort": {"device": 1, "last_refreshed": -1}},
+            {"$group": {
+                "_id": "$device",
+                "device": {"$first": "$device"},
+                "exchange_rate": {"$first": "$exchange_rate"},
+                "last_refreshed": {"$first": "$last_refreshed"},
+            }},
+            {"$project": {"_id": 0}},
+            {"$sort": {"device": 1}},
+        ]))
+    if metrics_enabled():
+        # One small document per device: the bytes are those of the documents re-encoded.
+        QUERY_BYTES.inc(sum(len(bson.encode(document)) for document in recent_data), collection=collection.name)
 
     if not recent_data:
-        raise ValueError("No recent Forex data found for the specified devices.")
+        raise ValueError("No recent Forex data found in the collection.")
 
     df = pd.DataFrame(recent_data)
     df['last_refreshed'] = pd.to_datetime(df['last_refreshed'])
     return df
 
 
-def load_full_forex_data(collection):
+def load_full_forex_data(collection, query=None):
     """
     Load the full Forex data for correlation analysis.
+    'query' optionally restricts the documents loaded (used for incremental refreshes).
     """
-    data = list(collection.find())
-    if not data:
+    df = load_columns(collection, FOREX_SCHEMA, query)
+    if df.empty:
         raise ValueError("No Forex data found in the collection.")
-
-    df = pd.DataFrame(data)
-    df['last_refreshed'] = pd.to_datetime(df['last_refreshed'])
     return df
 
     
     
 
-def load_weather_data(collection):
+def load_weather_data(collection, query=None):
     """
     Load weather data from the specified MongoDB collection.
-    - Converts 'day' column to datetime, 'temperature' and 'wind_speed' columns to numeric.
-    - Raises an exception if the 'day' column is missing or the collection is empty.
+    - Loads 'day' as the datetime 'date' column and 'region' as categorical.
+    - 'temperature' is the exact daily mean (temperature_sum / temperature_count) and 'wind_speed'
+      the daily max, both float32, read from the aggregates folded in by the summarize script.
+    - 'query' optionally restricts the documents loaded (used for incremental refreshes).
+    - Raises an exception if the 'day' field is missing or the collection is empty.
     """
-    data = list(collection.find())
-    if not data:
+    return weather_frame(load_columns(collection, WEATHER_SCHEMA, query))
+
+def weather_frame(df):
+    """Derive the daily 'temperature' and 'wind_speed' of the regions from the loaded aggregates."""
+    if df.empty:
         raise ValueError("La collection MongoDB 'weather' est vide ou n'a pas de données.")
-    df = pd.DataFrame(data)
-    
-    if "day" not in df.columns:
+
+    if df["day"].isna().all():
         raise KeyError("La colonne 'day' est absente. Vérifiez les données MongoDB ou leur extraction.")
-    df["date"] = pd.to_datetime(df["day"], errors="coerce")
-    df["temperature"] = pd.to_numeric(df["temperature"], errors="coerce")
-    df["wind_speed"] = pd.to_numeric(df["wind_speed"], errors="coerce")
-    return df
 
-df_crude_oil = load_crude_oil_data(collection_crude_oil)
-df_recent_forex = load_recent_forex_data(collection_forex)
-df_forex = load_full_forex_data(collection_forex)
-df_weather = load_weather_data(collection_weather)
-df_combined = pd.merge(df_crude_oil, df_weather, on="date", how="inner")
+    # Documents written before the aggregates only have the mean and the max.
+    count = df["temperature_count"].to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = df["temperature_sum"].to_numpy() / count
+    df["temperature"] = np.where(count > 0, mean, df["temperature"]).astype("float32")
+    df["wind_speed"] = df["wind_speed_max"].fillna(df["wind_speed"])
+    return df[["region", "day", "temperature", "wind_speed"]].rename(columns={"day": "date"})
+
+# The frames are loaded once here, then kept up to date by a background thread that only
+# fetches new documents, so new data shows up without restarting the app.
+refresher = DataRefresher(
+    collections={
+        "crude_oil": collection_crude_oil,
+        "forex": collection_forex,
+        "weather": collection_weather,
+        **({"crude_oil_rollups": collection_crude_oil_rollups} if crude_oil_rollups else {}),
+    },
+    loaders={
+        "crude_oil": load_crude_oil_data,
+        "forex": load_full_forex_data,
+        "recent_forex": load_recent_forex_data,
+        "weather": load_weather_data,
+        "crude_oil_rollups": load_crude_oil_rollups,
+    },
+    interval=float(os.getenv("REFRESH_INTERVAL", 60)),
+    snapshot_dir=SNAPSHOT_DIR or None,
+)
+
+def load_archived_data():
+    """
+    Run the initial load from the columnar archive (memory-mapped, without querying MongoDB).
+
+    Returns:
+        bool: False if the archive is missing a dataset or cannot be read.
+    """
+    if any(archive.manifest(dataset) is None for dataset in DATASETS):
+        logging.warning("The archive is incomplete, loading the data from MongoDB.")
+        return False
+
+    def recent_forex(collection):
+        df = load_archive(archive, "forex", FOREX_SCHEMA)
+        latest = df.sort_values("last_refreshed").groupby("device", observed=True).tail(1)
+        return latest.sort_values("device").reset_index(drop=True)
+
+    try:
+        refresher.load({
+            "crude_oil": lambda collection, query: crude_oil_frame(load_archive(archive, "crude_oil", CRUDE_OIL_SCHEMA)),
+            "forex": lambda collection, query: load_archive(archive, "forex", FOREX_SCHEMA),
+            "recent_forex": recent_forex,
+            "weather": lambda collection, query: weather_frame(load_archive(archive, "weather", WEATHER_SCHEMA)),
+            "crude_oil_rollups": lambda collection, query: archived_crude_oil_rollups(),
+        })
+    except Exception as e:
+        logging.warning(f"Failed to load the archive ({e}), loading the data from MongoDB.")
+        return False
+    return True
+
+def initial_load():
+    """
+    Run the initial load, from the archive on ARCHIVE_WARM_START, otherwise from MongoDB.
+
+    Returns:
+        bool: True if the frames must be reconciled with MongoDB right away (warm start).
+    """
+    if ARCHIVE_WARM_START and load_archived_data():
+        # The indexes are left to the summarize scripts, so that MongoDB is not queried at startup.
+        return True
+    ensure_indexes(db)
+    refresher.load()
+    return False
+
+def background_startup():
+    """
+    Load the data while the app is already serving requests (DASHBOARD_STARTUP=background).
+    - The snapshot of the last loaded frames is restored first (memory-mapped from local disk),
+      then reconciled with MongoDB by an immediate poll.
+    - Without a snapshot, the initial load is retried every STARTUP_RETRY_DELAY seconds until it
+      succeeds, so an unreachable MongoDB does not prevent the app from starting.
+    """
+    try:
+        frames = load_snapshot(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+        if frames is not None and not set(CRUDE_OIL_SCHEMA) <= set(frames["crude_oil"].columns):
+            # Saved by a former version (e.g. without the 'interpolated' flag): load the data instead.
+            logging.info("Ignoring the dashboard snapshot saved by a former version.")
+            frames = None
+        if frames is not None:
+            refresher.restore(frames)
+            logging.info("Dashboard data restored from the snapshot.")
+            refresher.start(immediate=True)
+            return
+    except Exception as e:
+        logging.warning(f"Failed to restore the dashboard snapshot ({e}), loading the data.")
+
+    while True:
+        try:
+            immediate = initial_load()
+            break
+        except Exception as e:
+            logging.error(f"Failed to load the dashboard data ({e}), retrying in {STARTUP_RETRY_DELAY}s.")
+            time.sleep(STARTUP_RETRY_DELAY)
+    refresher.start(immediate=immediate)
+
+if DASHBOARD_STARTUP == "background":
+    threading.Thread(target=background_startup, name="data-startup", daemon=True).start()
+else:
+    refresher.start(immediate=initial_load())
+
+# Every session reads the data, the derived views and the figures through this service.
+data_service = DataService(
+    refresher,
+    view_cache_size=VIEW_CACHE_SIZE,
+    figure_cache_size=FIGURE_CACHE_SIZE,
+    price_plot_max_points=PRICE_PLOT_MAX_POINTS,
+    price_plot_min_points=PRICE_PLOT_MIN_POINTS,
+)
+
+def loading_placeholder():
+    """Placeholder rendered by the data outputs until the data is loaded."""
+    return ui.div(
+        "Loading data...",
+        style="text-align: center; font-size: 18px; margin-top: 20px;"
+    )
 
 def server(input, output, session):
     """
@@ -105,26 +295,35 @@ def server(input, output, session):
     - Includes rendering UI elements such as dropdowns for selecting year, month, region, and weather variable.
     - Generates plots such as line plots, box plots, scatter plots, and correlation heatmaps.
     """
-    unique_years = sorted(df_crude_oil["year"].unique())
     unique_months = range(1, 13)
-    unique_regions = sorted(df_combined["region"].unique())
     weather_variables = ["temperature", "wind_speed"]
+    correlation_views = {
+        "window": "Rolling window",
+        "lag": "Lag in days (positive: the exchange rate leads)",
+    }
 
     @output
+    @instrument_output
     @render.ui
     def year_selected(): 
-        choices = ["All years"] + [str(year) for year in unique_years]
+        choices = ["All years"] + [str(year) for year in data_service.years()]
+        # Keep the user's selection when the choices are refreshed with new data.
+        with reactive.isolate():
+            selected = input.selected_year() if input.selected_year.is_set() else "All years"
+        if selected not in choices:
+            selected = "All years"
         return ui.div(
             ui.input_select(
                 id="selected_year",
                 label="Select a year",
                 choices=choices,
-                selected="All years"
+                selected=selected
             ), 
             style="margin-left: 20px;"
         )
     
     @output
+    @instrument_output
     @render.ui
     def month_selected(): 
         choices = ["All months"] + [str(month) for month in unique_months]
@@ -138,74 +337,138 @@ def server(input, output, session):
             style="margin-left: 20px;"
         )
 
-    @output
-    @render.ui
-    def price_plot():
-        global df_crude_oil
-        df = df_crude_oil.copy()
-
+    def price_selection():
+        """Selected (year, month) of the crude oil price charts."""
         year = input.selected_year() if input.selected_year() else "All years"
         month = input.selected_month() if input.selected_month() else "All months"
-        filtered_df = df.copy()
+        return year, month
+
+    def selection_args(year, month):
+        """(year, month) of a selection as DataService arguments (None means all)."""
+        return None if year == "All years" else int(year), None if month == "All months" else int(month)
+
+    def crude_prices(year, month):
+        # Read-only slice of the shared crude frame, looked up in the year/month partition index.
+        # Long ranges are downsampled with LTTB for the line.
+        return data_service.crude_prices(*selection_args(year, month))
+
+    def price_box(year, month):
+        # The box plot is drawn from the statistics of every day of the selection, computed once
+        # per data version: only the quartiles, fences, mean and outliers are sent.
+        stats = data_service.price_distribution(*selection_args(year, month))
+        fields = ["q1", "median", "q3", "lowerfence", "upperfence", "mean"]
+        if stats is None:
+            return {**{field: [] for field in fields}, "y": []}
+        return {**{field: [float(stats[field])] for field in fields}, "y": [stats["outliers"].tolist()]}
+
+    # Persistent figures: the price figures are created by price_plot once the first selection is
+    # known, then update_price_plot sends the traces of the next selections.
+    price_plot_created = reactive.value(False)
+    price_plot_selection = {"drawn": None}
 
-        if year != "All years":
-            filtered_df = filtered_df[filtered_df["year"] == int(year)]
-
-        if month != "All months":
-            filtered_df = filtered_df[filtered_df["month"] == int(month)]
-        
-        fig_line = px.line(
-            filtered_df,
-            x=filtered_df["date"],
-            y=filtered_df["value"],
-            title="Crude Oil Prices Over Time",
-            labels={"date": "Date", "value": "Price (USD)"},
-            template="plotly_white",
-        )
-        fig_line.update_traces(line=dict(color="#6a1636", width=2))
-        fig_line.update_layout(
-            title_font_size=20,
-            xaxis_title="Date",
-            yaxis_title="Price (USD)",
-            hovermode="x unified",
-            margin=dict(l=40, r=40, t=60, b=40),
-        )
-        # Box plot for value distribution
-        fig_box = px.box(
-            filtered_df,
-            y="value",
-            title="Price Distribution",
-            labels={"value": "Price (USD)"},
-            template="plotly_white",
-        )
-
-        fig_box.update_traces(marker_color="#6a1636", boxmean=True)
-        fig_box.update_layout(
-            title_font_size=20,
-            yaxis_title="Price (USD)",
-            margin=dict(l=40, r=40, t=60, b=40),
-        )
+    @output
+    @instrument_output
+    @render.ui
+    def price_plot():
+        if not data_service.loaded():
+            return loading_placeholder()
+        if PERSISTENT_FIGURES:
+            # Drawn again only for a new data version, with the last selection sent.
+            if not price_plot_created():
+                return None
+            year, month = price_plot_selection["drawn"]
+        else:
+            year, month = price_selection()
+
+        def render_html():
+            _, line_df = crude_prices(year, month)
+
+            fig_line = px.line(
+                line_df,
+                x=line_df["date"],
+                y=line_df["value"],
+                title="Crude Oil Prices Over Time",
+                labels={"date": "Date", "value": "Price (USD)"},
+                template="plotly_white",
+            )
+            fig_line.update_traces(line=dict(color="#6a1636", width=2))
+            fig_line.update_layout(
+                title_font_size=20,
+                xaxis_title="Date",
+                yaxis_title="Price (USD)",
+                hovermode="x unified",
+                margin=dict(l=40, r=40, t=60, b=40),
+            )
+            # Box plot for value distribution
+            fig_box = go.Figure(go.Box(
+                **price_box(year, month),
+                x0=" ",
+                name="",
+                boxpoints="outliers",
+                boxmean=True,
+                marker_color="#6a1636",
+            ))
+            fig_box.update_layout(
+                title="Price Distribution",
+                template="plotly_white",
+                title_font_size=20,
+                yaxis_title="Price (USD)",
+                margin=dict(l=40, r=40, t=60, b=40),
+            )
         
-        #return ui.HTML(fig_line.to_html(full_html=False))
-        return ui.HTML(f"""
-            <div style="display: flex; flex-direction: row; gap: 40px;  background-color: white ;padding: 10px;justify-content: space-between;">
-                <div style= " background-color: #f9f9f9;padding: 20px;border-radius: 10px; box-shadow: 0 2px 5px rgba(0, 0, 0, 0.1); width: 1000px">
-                    {ui.HTML(fig_line.to_html(full_html=False))}
-                </div>
-                 <div style= " background-color: #f9f9f9;padding: 20px;border-radius: 10px; box-shadow: 0 2px 5px rgba(0, 0, 0, 0.1); ">
-                    {ui.HTML(fig_box.to_html(full_html=False))}
+            return f"""
+                <div style="display: flex; flex-direction: row; gap: 40px;  background-color: white ;padding: 10px;justify-content: space-between;">
+                    <div style= " background-color: #f9f9f9;padding: 20px;border-radius: 10px; box-shadow: 0 2px 5px rgba(0, 0, 0, 0.1); width: 1000px">
+                        {figure_html(fig_line, div_id="price-plot-line")}
+                    </div>
+                     <div style= " background-color: #f9f9f9;padding: 20px;border-radius: 10px; box-shadow: 0 2px 5px rgba(0, 0, 0, 0.1); ">
+                        {figure_html(fig_box, div_id="price-plot-box")}
+                    </div>
                 </div>
-            </div>
-        """)
+            """
+
+        return ui.HTML(data_service.figure("price_plot", (year, month), render_html))
+
+    if PERSISTENT_FIGURES:
+        @reactive.effect
+        @reactive.event(input.selected_year, input.selected_month)
+        async def update_price_plot():
+            """
+            Send the traces of the new selection to the figures drawn by price_plot, as a
+            "plotly_traces" message: dates and prices only, the figures are not rebuilt.
+            """
+            selection = price_selection()
+            if selection == price_plot_selection["drawn"]:
+                return
+            price_plot_selection["drawn"] = selection
+            if not price_plot_created() or not data_service.loaded():
+                price_plot_created.set(True)
+                return
+            year, month = selection
+
+            def traces():
+                _, line_df = crude_prices(year, month)
+                return {
+                    "price-plot-line": [{
+                        "x": np.datetime_as_string(line_df["date"].to_numpy(), unit="D").tolist(),
+                        "y": line_df["value"].tolist(),
+                    }],
+                    "price-plot-box": [price_box(year, month)],
+                }
+            message = data_service.figure("price_plot_traces", (year, month), traces)
+            await session.send_custom_message("plotly_traces", message)
 
 
     @output
+    @instrument_output
     @render.ui
     def card_forex():
         """
         Render Forex cards showing the most recent data for each device.
         """
-        currency_data = df_recent_forex[['device', 'exchange_rate', 'last_refreshed']].to_dict(orient='records')
+        if not data_service.loaded():
+            return loading_placeholder()
+        currency_data = data_service.recent_forex()
 
         if not currency_data:
             return ui.div(
@@ -241,16 +504,23 @@ def server(input, output, session):
 
 
     @output
+    @instrument_output
     @render.ui
     def region_selector():
+        choices = ["All regions"] + data_service.regions()
+        with reactive.isolate():
+            selected = input.selected_region() if input.selected_region.is_set() else "All regions"
+        if selected not in choices:
+            selected = "All regions"
         return ui.input_select(
             id="selected_region",
             label="Select Region",
-            choices=["All regions"] + unique_regions,
-            selected="All regions"
+            choices=choices,
+            selected=selected
         )
 
     @output
+    @instrument_output
     @render.ui
     def variable_selector():
         return ui.input_select(
@@ -261,104 +531,88 @@ def server(input, output, session):
         )
 
     @output
+    @instrument_output
+    @render.ui
+    def correlation_view_selector():
+        return ui.input_select(
+            id="selected_correlation_view",
+            label="Select Heatmap",
+            choices={"window": "Rolling windows", "lag": "Lead/lag"},
+            selected="window"
+        )
+
+    @output
+    @instrument_output
     @render.ui
     def correlation_plot():
+        if not data_service.loaded():
+            return loading_placeholder()
         selected_region = input.selected_region() if input.selected_region() else "All regions"
         selected_variable = input.selected_variable()
 
-        df_filtered = df_combined.copy()
-
-        if selected_region != "All regions":
-            df_filtered = df_filtered[df_filtered["region"] == selected_region]
+        def render_html():
+            region = None if selected_region == "All regions" else selected_region
+            # Read-only block of the region's rows, and O(1) correlation from the running statistics.
+            df_filtered, correlation = data_service.weather_prices(region, selected_variable)
 
         
-        correlation = df_filtered[selected_variable].corr(df_filtered["value"])
+            scatter_fig = px.scatter(
+                df_filtered,
+                x=selected_variable,
+                y="value",
+                title=f"Correlation between {selected_variable} and Crude Oil Prices (Corr: {correlation:.2f})",
+                labels={selected_variable: selected_variable.capitalize(), "value": "Crude Oil Price (USD)"},
+                template="plotly_white"
+            )
+            scatter_fig.update_traces(marker=dict(color='rgb(128, 0, 32)', size=8))
+            scatter_fig.update_layout(
+                title_font_size=20,
+                margin=dict(l=40, r=40, t=60, b=40),
+            )
 
-        
-        scatter_fig = px.scatter(
-            df_filtered,
-            x=selected_variable,
-            y="value",
-            title=f"Correlation between {selected_variable} and Crude Oil Prices (Corr: {correlation:.2f})",
-            labels={selected_variable: selected_variable.capitalize(), "value": "Crude Oil Price (USD)"},
-            template="plotly_white"
-        )
-        scatter_fig.update_traces(marker=dict(color='rgb(128, 0, 32)', size=8))
-        scatter_fig.update_layout(
-            title_font_size=20,
-            margin=dict(l=40, r=40, t=60, b=40),
-        )
+            return figure_html(scatter_fig)
 
-        return ui.HTML(scatter_fig.to_html(full_html=False))
+        return ui.HTML(data_service.figure("correlation_plot", (selected_region, selected_variable), render_html))
   
 
 
-    def calculate_forex_crude_correlation(df_crude_oil, df_forex):
-        
-        df_forex_copy = df_forex.rename(columns={'last_refreshed': 'date'})
-        
-        df_crude_oil['date'] = pd.to_datetime(df_crude_oil['date']).dt.date
-        df_forex_copy['date'] = pd.to_datetime(df_forex_copy['date']).dt.date
-
-       
-        df_combined = pd.merge(df_crude_oil, df_forex_copy, on="date", how="inner")
-
-       
-        df_combined['value'] = pd.to_numeric(df_combined['value'], errors='coerce')
-        df_combined['exchange_rate'] = pd.to_numeric(df_combined['exchange_rate'], errors='coerce')
-
-        
-        forex_columns = ['exchange_rate']
-        df_corr = df_combined[['device', 'value'] + forex_columns]
-
-       
-        correlation_results = {}
-        for device in df_corr['device'].unique():
-            df_device = df_corr[df_corr['device'] == device]
-            if not df_device.empty:
-                
-                correlation = df_device[['value', 'exchange_rate']].corr().iloc[0, 1]
-                correlation_results[device] = correlation
-
-        
-        correlation_matrix = pd.DataFrame.from_dict(
-            correlation_results, orient='index', columns=['Correlation']
-        )
-        correlation_matrix.index.name = 'Device'
-        
-        return correlation_matrix
-
-
     @output
+    @instrument_output
     @render.ui
     def correlation_heatmap():
-      
-        correlation_matrix = calculate_forex_crude_correlation(df_crude_oil, df_forex)
-        custom_colorscale = [
-        [0, '#2e081b'],      
-        [0.25, '#4d1028'],  
-        [0.5, '#6a1636'],    
-        [0.75, '#a34274'],  
-        [1, '#e1b3c3']      
-         ]
+        if not data_service.loaded():
+            return loading_placeholder()
+        view = input.selected_correlation_view() if input.selected_correlation_view() else "window"
+        def render_html():
+            # Device x window or device x lag grid, computed by the refresher once per data version.
+            correlation_matrix = data_service.forex_correlation(view)
+            custom_colorscale = [
+            [0, '#2e081b'],      
+            [0.25, '#4d1028'],  
+            [0.5, '#6a1636'],    
+            [0.75, '#a34274'],  
+            [1, '#e1b3c3']      
+             ]
         
-        fig_heatmap = go.Figure(data=go.Heatmap(
-            z=correlation_matrix['Correlation'].values.reshape(-1, 1), 
-            x=['Correlation'],  
-            y=correlation_matrix.index, 
-            colorscale=custom_colorscale,
-            zmin=-1, zmax=1,
-            colorbar=dict(title="Correlation Coefficient")
-        ))
+            fig_heatmap = go.Figure(data=go.Heatmap(
+                z=correlation_matrix.values, 
+                x=[str(column) for column in correlation_matrix.columns],  
+                y=correlation_matrix.index, 
+                colorscale=custom_colorscale,
+                zmin=-1, zmax=1,
+                colorbar=dict(title="Correlation Coefficient")
+            ))
 
         
-        fig_heatmap.update_layout(
-            title="Correlation Heatmap: Crude Oil Prices vs Forex Exchange Rates",
-            xaxis_title="Exchange Rates",
-            yaxis_title="Currency",
-            template="plotly_white",
-            title_font_size=20,
-            margin=dict(l=40, r=40, t=60, b=40),
-        )
+            fig_heatmap.update_layout(
+                title="Correlation Heatmap: Crude Oil Prices vs Forex Exchange Rates",
+                xaxis_title=correlation_views[view],
+                yaxis_title="Currency",
+                template="plotly_white",
+                title_font_size=20,
+                margin=dict(l=40, r=40, t=60, b=40),
+            )
+
+            return figure_html(fig_heatmap)
 
-        return ui.HTML(fig_heatmap.to_html(full_html=False))
+        return ui.HTML(data_service.figure("correlation_heatmap", (view,), render_html))
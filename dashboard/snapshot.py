@@ -0,0 +1,91 @@
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+# Frames of the refresher saved in a snapshot; the other frames are derived from them.
+# 'crude_oil_rollups' is only loaded if its collection is configured.
+SNAPSHOT_FRAMES = ["crude_oil", "forex", "weather", "recent_forex", "crude_oil_rollups"]
+
+
+def save_snapshot(frames, directory):
+    """
+    Save the loaded frames of the refresher to 'directory', as one .npy file per column.
+    - Categorical columns are saved as their integer codes, with the categories in the manifest;
+      string columns as fixed-width unicode arrays. Every file can then be memory-mapped.
+    - The frames are written in a new generation directory and 'manifest.json' is replaced
+      atomically, so a reader never sees a partial snapshot.
+    """
+    os.makedirs(directory, exist_ok=True)
+    previous = _read_manifest(directory)
+    generation = previous["generation"] + 1 if previous else 0
+    path = os.path.join(directory, str(generation))
+    shutil.rmtree(path, ignore_errors=True)
+
+    manifest = {"generation": generation, "frames": {}}
+    for name in SNAPSHOT_FRAMES:
+        if name not in frames:
+            continue
+        df = frames[name]
+        os.makedirs(os.path.join(path, name))
+        columns = {}
+        for column in df.columns:
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                columns[column] = {"kind": "category", "categories": [str(c) for c in values.cat.categories]}
+                array = values.cat.codes.to_numpy()
+            elif values.dtype.kind in "biufmM":
+                columns[column] = {"kind": "array"}
+                array = values.to_numpy()
+            else:
+                columns[column] = {"kind": "str"}
+                array = values.to_numpy(dtype=str)
+            np.save(os.path.join(path, name, f"{column}.npy"), array)
+        manifest["frames"][name] = columns
+
+    manifest_path = os.path.join(directory, "manifest.json")
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    if previous:
+        shutil.rmtree(os.path.join(directory, str(previous["generation"])), ignore_errors=True)
+
+
+def load_snapshot(directory):
+    """
+    Load the frames saved by 'save_snapshot', memory-mapped (copy-on-write).
+
+    Returns:
+        dict | None: Frames keyed by name, or None if 'directory' holds no snapshot.
+    """
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        return None
+
+    path = os.path.join(directory, str(manifest["generation"]))
+    frames = {}
+    for name, columns in manifest["frames"].items():
+        data = {}
+        for column, spec in columns.items():
+            # A plain ndarray view of the memory map (no copy).
+            array = np.asarray(np.load(os.path.join(path, name, f"{column}.npy"), mmap_mode="c"))
+            if spec["kind"] == "category":
+                data[column] = pd.Categorical.from_codes(array, categories=spec["categories"])
+            elif spec["kind"] == "str":
+                data[column] = array.astype(object)
+            else:
+                data[column] = array
+        frames[name] = pd.DataFrame(data, copy=False)
+    return frames
+
+
+def _read_manifest(directory):
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
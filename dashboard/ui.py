@@ -1,7 +1,13 @@
 from shiny import ui
+from figures import plotly_js_dependency, plotly_traces_handler
 
 
 app_ui = ui.page_fluid(
+    # plotly.js is loaded once here; the figures rendered by the server do not embed it.
+    plotly_js_dependency(),
+    # Updates the figures drawn once per session in place (PERSISTENT_FIGURES).
+    plotly_traces_handler(),
+
     ui.div(
         ui.h3("Crude Oil Dashboard", style="text-align: left ; color: #fff; margin: 0;"),
         style="background-color: #6a1636; padding: 20px; font-size: 22px;"
@@ -47,6 +53,10 @@ app_ui = ui.page_fluid(
                 ui.output_ui("variable_selector"),
                 style="margin-right: 10px;"
             ),
+            ui.div(
+                ui.output_ui("correlation_view_selector"),
+                style="margin-right: 10px;"
+            ),
             style="display: flex; flex-direction: row; justify-content: flex-start; gap: 40px; padding: 10px; margin-left: 20px"
         ),
         ui.div(
@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+
+# Default root directory of the archive (one sub-directory per dataset), overridden by the
+# ARCHIVE_DIR environment variable (see archive_dir).
+DEFAULT_ARCHIVE_DIR = os.path.join(script_dir, "../data/archive")
+
+# Datasets written at ingest time, as stored in MongoDB.
+# - "date": column used to partition the rows by month.
+# - "keys": columns identifying a row (the upsert filter of the summarize script).
+# - "merge": how rows of the same keys are combined, as the summarize script does in MongoDB:
+#   "last" ($set, the new row wins), "first" ($setOnInsert, the stored row wins) or "fold"
+#   ($inc of the "sum" columns, $max of the "max" columns).
+# - "columns": column types ("datetime", "str", "float64", "int64", "bool").
+# - "collection": environment variable holding the collection name.
+# - "date_format": format of the date in MongoDB, if it is stored as a string.
+DATASETS = {
+    "crude_oil": {
+        "date": "date",
+        "keys": ["date"],
+        "merge": "last",
+        "columns": {"date": "datetime", "value": "float64", "year": "int64", "month": "int64", "interpolated": "bool"},
+        "collection": "CRUDE_COLLECTION_NAME",
+    },
+    "forex": {
+        "date": "last_refreshed",
+        "keys": ["device", "last_refreshed"],
+        "merge": "first",
+        "columns": {"device": "str", "exchange_rate": "float64", "last_refreshed": "datetime"},
+        "collection": "FOREX_COLLECTION_NAME",
+        "date_format": "%Y-%m-%d %H:%M:%S",
+    },
+    "weather": {
+        "date": "day",
+        "keys": ["region", "day"],
+        "merge": "fold",
+        "sum": ["temperature_count", "temperature_sum", "wind_speed_count", "wind_speed_sum"],
+        "max": ["temperature_max", "wind_speed_max"],
+        "columns": {
+            "region": "str", "day": "datetime",
+            "temperature_count": "int64", "temperature_sum": "float64", "temperature_max": "float64",
+            "wind_speed_count": "int64", "wind_speed_sum": "float64", "wind_speed_max": "float64",
+        },
+        "collection": "WEATHER_COLLECTION_NAME",
+    },
+}
+
+# Number of operations sent per bulk_write call when restoring.
+RESTORE_BATCH_SIZE = 1000
+
+
+def archive_dir():
+    """
+    Return the root directory of the archive. Read when an Archive is created rather than at
+    import, so that an ARCHIVE_DIR set in the .env file loaded by the importing script is used.
+    """
+    return os.getenv("ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR)
+
+
+class Archive:
+    """
+    Columnar archive of the ingested data, written next to MongoDB by the summarize scripts.
+    - Each dataset is split in monthly partitions; a partition is a directory holding one .npy
+      file per column, which readers can memory-map.
+    - 'manifest.json' lists the partitions of a dataset with their row count and date range, so
+      that a read or a backfill only opens the partitions of the requested range.
+    - A partition is rewritten in a new directory and the manifest replaced atomically: readers
+      never see a partially written partition.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or archive_dir()
+
+    def manifest(self, dataset):
+        """Return the manifest of a dataset, or None if it has not been written yet."""
+        path = os.path.join(self.root, dataset, "manifest.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def partitions(self, dataset, start=None, end=None):
+        """Return the names of the partitions holding rows between 'start' and 'end' (inclusive)."""
+        manifest = self.manifest(dataset)
+        if manifest is None:
+            return []
+        return sorted(
+            name for name, partition in manifest["partitions"].items()
+            if (start is None or pd.Timestamp(partition["max"]) >= pd.Timestamp(start))
+            and (end is None or pd.Timestamp(partition["min"]) <= pd.Timestamp(end))
+        )
+
+    def read(self, dataset, start=None, end=None, columns=None, mmap=True):
+        """
+        Read the rows of a dataset between 'start' and 'end' (inclusive, None: unbounded).
+
+        Args:
+            dataset (str): Name of the dataset (see DATASETS).
+            columns (list[str] | None): Columns to read (default: all).
+            mmap (bool): Memory-map the column files instead of reading them.
+
+        Returns:
+            pd.DataFrame: Rows sorted by date (an empty frame if nothing matches).
+        """
+        spec = DATASETS[dataset]
+        columns = list(spec["columns"]) if columns is None else columns
+        names = self.partitions(dataset, start, end)
+        if not names:
+            return _empty_frame(spec, columns)
+
+        loaded = columns if spec["date"] in columns else columns + [spec["date"]]
+        frames = [self.read_partition(dataset, name, loaded, mmap) for name in names]
+        df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+        return _between(df, spec["date"], start, end)[columns]
+
+    def read_partition(self, dataset, name, columns=None, mmap=True):
+        """Read the rows of one partition (e.g. "2024-01") of a dataset."""
+        spec = DATASETS[dataset]
+        columns = list(spec["columns"]) if columns is None else columns
+        path = self.manifest(dataset)["partitions"][name]["path"]
+        return self._read_partition(dataset, path, columns, mmap)
+
+    def write(self, dataset, df):
+        """
+        Merge rows into the archive of a dataset, partition by partition (see DATASETS["merge"]).
+
+        Args:
+            dataset (str): Name of the dataset (see DATASETS).
+            df (pd.DataFrame): Rows, with at least the key columns.
+        """
+        spec = DATASETS[dataset]
+        df = _conform(df, spec)
+        df = df[df[spec["date"]].notna()]
+        if df.empty:
+            return
+
+        directory = os.path.join(self.root, dataset)
+        os.makedirs(directory, exist_ok=True)
+        manifest = self.manifest(dataset) or {"dataset": dataset, "date": spec["date"], "partitions": {}}
+        removed = []
+
+        for name, rows in df.groupby(df[spec["date"]].dt.strftime("%Y-%m")):
+            current = manifest["partitions"].get(name)
+            if current is not None:
+                existing = self._read_partition(dataset, current["path"], list(spec["columns"]), mmap=False)
+                rows = pd.concat([existing, rows], ignore_index=True)
+                removed.append(current["path"])
+            rows = _merge(rows, spec)
+
+            generation = current["generation"] + 1 if current else 0
+            path = f"{name}.{generation}"
+            os.makedirs(os.path.join(directory, path), exist_ok=True)
+            for column, kind in spec["columns"].items():
+                # Strings are stored as fixed-width unicode arrays, which can be memory-mapped.
+                values = rows[column].to_numpy(dtype=str if kind == "str" else None)
+                np.save(os.path.join(directory, path, f"{column}.npy"), values)
+            dates = rows[spec["date"]]
+            manifest["partitions"][name] = {
+                "path": path,
+                "generation": generation,
+                "rows": len(rows),
+                "min": dates.min().isoformat(),
+                "max": dates.max().isoformat(),
+            }
+
+        manifest_path = os.path.join(directory, "manifest.json")
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        for path in removed:
+            shutil.rmtree(os.path.join(directory, path), ignore_errors=True)
+
+    def _read_partition(self, dataset, path, columns, mmap):
+        directory = os.path.join(self.root, dataset, path)
+        mode = "r" if mmap else None
+        return pd.DataFrame(
+            {column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode=mode) for column in columns},
+            copy=False,
+        )
+
+
+def archive_rows(dataset, df, archive=None):
+    """
+    Write ingested rows to the archive (the one of archive_dir by default), logging failures: the archive
+    never makes an ingestion fail.
+    """
+    try:
+        (archive or Archive()).write(dataset, df)
+    except Exception as e:
+        logging.error(f"Failed to archive {len(df)} {dataset} rows: {e}")
+
+
+def restore(db, dataset, start=None, end=None, archive=None):
+    """
+    Upsert the archived rows of a dataset between 'start' and 'end' into MongoDB (backfill or
+    rebuild). Only the partitions of the range are read. The archived rows are complete, so they
+    are written with $set, including for the mergeable weather aggregates.
+
+    Returns:
+        int: Number of documents inserted or modified.
+    """
+    spec = DATASETS[dataset]
+    archive = archive or Archive()
+    collection = db[os.getenv(spec["collection"])]
+    written = 0
+    for name in archive.partitions(dataset, start, end):
+        df = _between(archive.read_partition(dataset, name, mmap=False), spec["date"], start, end)
+        records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+        for record in records:
+            date = record[spec["date"]].to_pydatetime()
+            record[spec["date"]] = date.strftime(spec["date_format"]) if "date_format" in spec else date
+        operations = [
+            UpdateOne({key: record[key] for key in spec["keys"]}, {"$set": record}, upsert=True)
+            for record in records
+        ]
+        for i in range(0, len(operations), RESTORE_BATCH_SIZE):
+            result = collection.bulk_write(operations[i:i + RESTORE_BATCH_SIZE], ordered=False)
+            written += result.upserted_count + result.modified_count
+    return written
+
+
+def _conform(df, spec):
+    """Return the columns of the dataset with their archive types (missing columns are left empty)."""
+    columns = {}
+    for column, kind in spec["columns"].items():
+        values = df[column] if column in df else pd.Series(np.nan, index=df.index)
+        if kind == "datetime":
+            columns[column] = pd.to_datetime(values, errors="coerce").astype("datetime64[ns]")
+        elif kind == "str":
+            columns[column] = values.astype(str).astype(object)
+        elif kind == "bool":
+            columns[column] = values.fillna(False).astype(bool)
+        elif kind == "int64":
+            columns[column] = pd.to_numeric(values, errors="coerce").fillna(0).astype("int64")
+        else:
+            columns[column] = pd.to_numeric(values, errors="coerce").astype(kind)
+    return pd.DataFrame(columns)
+
+
+def _merge(rows, spec):
+    """Combine the rows of the same keys (see DATASETS["merge"]) and sort them by date."""
+    if spec["merge"] == "fold":
+        aggregations = {column: "sum" for column in spec["sum"]}
+        aggregations.update({column: "max" for column in spec["max"]})
+        rows = rows.groupby(spec["keys"], as_index=False, sort=False).agg(aggregations)
+    else:
+        rows = rows.drop_duplicates(spec["keys"], keep=spec["merge"])
+    rows = rows.sort_values([spec["date"]] + spec["keys"], kind="stable").reset_index(drop=True)
+    return rows[list(spec["columns"])]
+
+
+def _between(df, date, start, end):
+    """Return the rows of 'df' whose 'date' is between 'start' and 'end' (inclusive, None: unbounded)."""
+    if start is None and end is None:
+        return df
+    keep = np.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= (df[date] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        keep &= (df[date] <= pd.Timestamp(end)).to_numpy()
+    return df[keep].reset_index(drop=True)
+
+
+def _empty_frame(spec, columns):
+    dtypes = {"datetime": "datetime64[ns]", "str": "<U1", "bool": bool}
+    return pd.DataFrame({
+        column: np.array([], dtype=dtypes.get(spec["columns"][column], spec["columns"][column]))
+        for column in columns
+    })
+
+
+if __name__ == "__main__":
+    load_dotenv(os.path.join(script_dir, ".env"))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Columnar archive of the ingested data.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    restore_parser = subparsers.add_parser("restore", help="Upsert archived rows into MongoDB.")
+    restore_parser.add_argument("datasets", nargs="*", choices=list(DATASETS), default=list(DATASETS))
+    restore_parser.add_argument("--start", help="First date to restore (YYYY-MM-DD).")
+    restore_parser.add_argument("--end", help="Last date to restore (YYYY-MM-DD).")
+    subparsers.add_parser("list", help="List the partitions of every dataset.")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        archive = Archive()
+        for dataset in DATASETS:
+            manifest = archive.manifest(dataset) or {"partitions": {}}
+            rows = sum(partition["rows"] for partition in manifest["partitions"].values())
+            logging.info(f"{dataset}: {len(manifest['partitions'])} partitions, {rows} rows")
+        sys.exit(0)
+
+    client = MongoClient(os.getenv("MONGO_URI"))
+    db = client[os.getenv("DB_NAME")]
+    for dataset in args.datasets:
+        written = restore(db, dataset, args.start, args.end)
+        logging.info(f"Restored {written} {dataset} documents.")
+    client.close()
@@ -0,0 +1,201 @@
+"""
+Check collector.py against a local stub of the Open-Meteo and Alpha Vantage APIs (http.server).
+
+- Batching: the grid is fetched in ceil(points / WEATHER_BATCH_SIZE) requests of comma-separated
+  coordinates, every point exactly once, and each location is labelled with its requested point.
+- Rate limiting: at any time, the requests received by each API stay within the burst of its
+  token bucket plus its rate, and no more than 'concurrency' requests are in flight.
+- Errors: a failed request is retried, and a rate limit message (a 200 response) leaves its
+  device out of the forex file.
+- Output: one consolidated file per source, written under a temporary name then renamed; a
+  write that fails leaves the previous file untouched and no '*.json' file behind.
+
+Run from the scripts directory:
+
+    python check_collector.py
+"""
+import os
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Small batches, so that the grid needs more requests than the burst of the rate limiter.
+os.environ["WEATHER_BATCH_SIZE"] = "30"
+
+import collector
+from raw_files import list_raw_files
+
+CONCURRENCY = 3
+WEATHER_RATE = 20.0
+FOREX_RATE = 10.0
+# Time the stub takes to answer, so that requests overlap.
+RESPONSE_DELAY = 0.02
+# Device answered with a rate limit message, and device whose first request fails.
+LIMITED_DEVICE = "NGN"
+FAILING_DEVICE = "CAD"
+
+
+class StubAPI(BaseHTTPRequestHandler):
+    """Open-Meteo on /forecast and Alpha Vantage on /query, recording every request."""
+
+    requests = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with self.lock:
+            StubAPI.requests.append((url.path, params, time.monotonic()))
+            StubAPI.in_flight += 1
+            StubAPI.max_in_flight = max(StubAPI.max_in_flight, StubAPI.in_flight)
+            attempts = sum(1 for path, other, _ in StubAPI.requests if path == url.path and other == params)
+        try:
+            time.sleep(RESPONSE_DELAY)
+            if url.path == "/forecast":
+                self.reply(200, weather_response(params))
+            elif params.get("to_currency") == FAILING_DEVICE and attempts == 1:
+                self.reply(500, {"error": "temporary failure"})
+            elif params.get("to_currency") == LIMITED_DEVICE:
+                self.reply(200, {"Note": "API call frequency exceeded."})
+            else:
+                self.reply(200, forex_response(params["to_currency"]))
+        finally:
+            with self.lock:
+                StubAPI.in_flight -= 1
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def weather_response(params):
+    """One location per coordinate, on the (shifted) grid cell of the API, as Open-Meteo."""
+    latitudes = params["latitude"].split(",")
+    longitudes = params["longitude"].split(",")
+    locations = [
+        {
+            "latitude": float(lat) + 0.01,
+            "longitude": float(lon) - 0.01,
+            "hourly": {"time": ["2024-01-01T00:00"], "temperature_2m": [float(lat)], "wind_speed_10m": [float(lon)]},
+        }
+        for lat, lon in zip(latitudes, longitudes)
+    ]
+    return locations if len(locations) > 1 else locations[0]
+
+
+def forex_response(device):
+    return {"Realtime Currency Exchange Rate": {
+        "3. To_Currency Code": device,
+        "5. Exchange Rate": "1.00000",
+        "6. Last Refreshed": "2024-01-01 00:00:00",
+    }}
+
+
+def check_rate(times, rate, burst):
+    """Every request was sent within the burst plus the tokens refilled since the first one."""
+    times = sorted(times)
+    for k, t in enumerate(times):
+        # One token of slack for the time between the creation of the bucket and the first request.
+        assert k + 1 <= burst + 1 + rate * (t - times[0]), (k, t - times[0])
+    if len(times) > burst + 1:
+        assert times[-1] - times[0] >= (len(times) - burst - 1) / rate * 0.9
+
+
+def check_batching(requests):
+    points = collector.grid_points()
+    batch_size = collector.WEATHER_BATCH_SIZE
+    assert len(requests) == -(-len(points) // batch_size), len(requests)
+    requested = []
+    for params in requests:
+        batch = list(zip(map(int, params["latitude"].split(",")), map(int, params["longitude"].split(","))))
+        assert 1 < len(batch) <= batch_size, len(batch)
+        requested += batch
+    assert sorted(requested) == sorted(points)
+
+
+def check_outputs(raw_dir, paths, replaced):
+    weather_files = list_raw_files(os.path.join(raw_dir, "weather"))
+    forex_files = list_raw_files(os.path.join(raw_dir, "forex_data"))
+    assert weather_files == [paths["weather"]] and forex_files == [paths["forex"]]
+    for directory in ("weather", "forex_data"):
+        assert not [name for name in os.listdir(os.path.join(raw_dir, directory)) if name.endswith(".tmp")]
+    assert sorted(replaced) == sorted((path + ".tmp", path) for path in paths.values())
+
+    with open(paths["weather"]) as f:
+        locations = json.load(f)
+    assert sorted((location["latitude"], location["longitude"]) for location in locations) == sorted(collector.grid_points())
+    # The values of each location are those of its requested point.
+    assert all(location["hourly"]["temperature_2m"] == [location["latitude"]] for location in locations)
+
+    with open(paths["forex"]) as f:
+        rates = json.load(f)
+    assert sorted(rates) == sorted(device for device in collector.DEVICES if device != LIMITED_DEVICE)
+
+
+def check_failed_write(directory):
+    path = collector.write_json({"ok": 1}, directory, "data.json")
+    try:
+        collector.write_json({"bad": object()}, directory, "data.json")
+    except TypeError:
+        pass
+    with open(path) as f:
+        assert json.load(f) == {"ok": 1}
+    assert list_raw_files(directory) == [path]
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    collector.RETRY_DELAY = 0.1
+
+    replaced = []
+    replace = collector.os.replace
+
+    def record_replace(src, dst):
+        replaced.append((src, dst))
+        replace(src, dst)
+
+    collector.os.replace = record_replace
+    try:
+        with tempfile.TemporaryDirectory() as raw_dir:
+            paths = asyncio.run(collector.collect(
+                ["weather", "forex"], raw_dir,
+                weather_url=f"{base_url}/forecast", forex_url=f"{base_url}/query",
+                concurrency=CONCURRENCY, weather_rate=WEATHER_RATE, forex_rate=FOREX_RATE,
+            ))
+            weather = [params for path, params, _ in StubAPI.requests if path == "/forecast"]
+            forex = [params for path, params, _ in StubAPI.requests if path == "/query"]
+            check_batching(weather)
+            check_rate([t for path, _, t in StubAPI.requests if path == "/forecast"], WEATHER_RATE, collector.OPEN_METEO_BURST)
+            check_rate([t for path, _, t in StubAPI.requests if path == "/query"], FOREX_RATE, collector.ALPHA_VANTAGE_BURST)
+            assert StubAPI.max_in_flight <= CONCURRENCY, StubAPI.max_in_flight
+            # Every device once, and the failing one retried.
+            assert sorted(params["to_currency"] for params in forex) == sorted(collector.DEVICES + [FAILING_DEVICE])
+            check_outputs(raw_dir, paths, replaced)
+            check_failed_write(os.path.join(raw_dir, "failed"))
+    finally:
+        collector.os.replace = replace
+        server.shutdown()
+
+    print(
+        f"{len(collector.grid_points())} points in {len(weather)} weather requests and "
+        f"{len(forex)} forex requests, within the rate and concurrency limits; one file per source."
+    )
+
+
+if __name__ == "__main__":
+    main()
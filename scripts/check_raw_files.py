@@ -0,0 +1,81 @@
+"""
+Check the streaming JSON parser of raw_files.py (iter_json_array) against json.load.
+
+- Files shaped like the raw files (the array under a key, with other keys around it, records in
+  increasing or decreasing date order like the Alpha Vantage files) are parsed with every block
+  size from 1 to 64 characters, compact or indented, plain or gzip-compressed: the items must be
+  those of json.load.
+- Files truncated at every position must raise json.JSONDecodeError (or KeyError before the
+  opening bracket of the array), as the summarize scripts expect of a file still being written,
+  unless the cut is after the end of the array, in which case every item must have been read.
+
+Run from the scripts directory:
+
+    python check_raw_files.py
+"""
+import os
+import io
+import sys
+import gzip
+import json
+import random
+import tempfile
+
+from raw_files import iter_json_array, open_raw_file, chunked
+
+BLOCK_SIZES = range(1, 65)
+
+
+def random_file(rng, descending):
+    """A raw file, with values that look like the delimiters the parser looks for."""
+    days = sorted(rng.sample(range(1, 10000), rng.randint(0, 40)), reverse=descending)
+    records = [
+        {"date": f"{2000 + day // 365}-{day % 12 + 1:02d}-{day % 28 + 1:02d}", "value": rng.choice([
+            f"{rng.uniform(0, 150):.2f}", ".", "1e3", "a,]\"b", None, -1.5e10, 123456789, [1, [2, "]"]], {},
+        ])}
+        for day in days
+    ]
+    document = {"name": 'x "data": [', "unit": "data", "data": records, "after": [9]}
+    return json.dumps(document, indent=rng.choice([None, 1, 4])), records
+
+
+def check_block_sizes(text, records):
+    for block_size in BLOCK_SIZES:
+        items = list(iter_json_array(io.StringIO(text), "data", block_size=block_size))
+        assert items == records, block_size
+
+
+def check_gzip(text, records):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "raw.json.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(text)
+        with open_raw_file(path) as f:
+            assert list(iter_json_array(f, "data", block_size=7)) == records
+
+
+def check_truncated(text, records, block_size):
+    # End of the array: the closing bracket of the value of "data".
+    end = text.index('"after"')
+    for cut in range(len(text)):
+        try:
+            items = list(iter_json_array(io.StringIO(text[:cut]), "data", block_size=block_size))
+        except (json.JSONDecodeError, KeyError):
+            continue
+        assert cut >= text.rindex("]", 0, end) + 1 and items == records, cut
+
+
+def main(files=30, seed=0):
+    rng = random.Random(seed)
+    for i in range(files):
+        text, records = random_file(rng, descending=i % 2 == 1)
+        assert json.loads(text)["data"] == records
+        check_block_sizes(text, records)
+        check_gzip(text, records)
+        check_truncated(text, records, block_size=rng.choice([7, 64]))
+    assert list(chunked(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    print(f"{files} files parsed like json.load with block sizes 1 to 64.")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
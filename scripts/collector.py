@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from datetime import datetime
+
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables from the .env file
+script_dir = os.path.dirname(os.path.realpath(__file__))
+load_dotenv(os.path.join(script_dir, ".env"))
+
+RAW_DIR = os.path.join(script_dir, "../data/raw")
+
+# APIs (the base URLs can point to a local stub server).
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+ALPHA_VANTAGE_URL = os.getenv("ALPHA_VANTAGE_URL", "https://www.alphavantage.co/query")
+API_KEY = os.getenv("API_KEY")
+
+# Grid of points fetched from Open-Meteo, every 2 degrees (13 x 30 points, as weather_data_collector.sh).
+LATITUDES = range(24, 50, 2)
+LONGITUDES = range(-125, -65, 2)
+HOURLY_VARIABLES = "temperature_2m,wind_speed_10m,cloudcover"
+
+# Currencies quoted against USD.
+DEVICES = ["SAR", "EUR", "CNY", "CAD", "NGN"]
+
+# Number of coordinates sent in one Open-Meteo request (the API accepts comma-separated lists).
+WEATHER_BATCH_SIZE = int(os.getenv("WEATHER_BATCH_SIZE", 100))
+# Maximum number of requests in flight.
+COLLECTOR_CONCURRENCY = int(os.getenv("COLLECTOR_CONCURRENCY", 8))
+# Allowed request rate per API (requests per second) and burst (requests sent without waiting).
+OPEN_METEO_RATE = float(os.getenv("OPEN_METEO_RATE", 5))
+OPEN_METEO_BURST = 5
+ALPHA_VANTAGE_RATE = float(os.getenv("ALPHA_VANTAGE_RATE", 5 / 60))
+ALPHA_VANTAGE_BURST = 5
+# Attempts per request and delay between two attempts (seconds), as 'curl --retry 3 --retry-delay 2'.
+RETRIES = 3
+RETRY_DELAY = 2
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# httpx logs every request (with the API key) at INFO.
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter for asyncio tasks.
+    - Holds at most 'capacity' tokens, refilled at 'rate' tokens per second.
+    - 'acquire' waits until a token is available and takes it.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def fetch_json(client, url, params, limiter, semaphore):
+    """
+    GET a JSON document, within the concurrency limit and the rate of the API.
+    - Failed requests (network errors, HTTP errors) are retried RETRIES times.
+
+    Returns:
+        dict | list: Decoded response.
+    """
+    async with semaphore:
+        for attempt in range(1, RETRIES + 1):
+            await limiter.acquire()
+            try:
+                response = await client.get(url, params=params)
+                response.raise_for_status()
+                return response.json()
+            except (httpx.HTTPError, json.JSONDecodeError) as e:
+                if attempt == RETRIES:
+                    raise
+                logging.warning(f"Request to {url} failed ({e}), retrying in {RETRY_DELAY}s.")
+                await asyncio.sleep(RETRY_DELAY)
+
+
+def grid_points(latitudes=LATITUDES, longitudes=LONGITUDES):
+    """Return the (latitude, longitude) points of the grid."""
+    return [(lat, lon) for lat in latitudes for lon in longitudes]
+
+
+async def fetch_weather(client, points, limiter, semaphore, base_url=OPEN_METEO_URL, batch_size=WEATHER_BATCH_SIZE):
+    """
+    Fetch the hourly forecast of the day for every point, 'batch_size' points per request.
+
+    Returns:
+        list[dict]: One Open-Meteo location object per point fetched, with 'latitude' and
+        'longitude' set to the requested point (the API returns the nearest cell of its own grid).
+    """
+    batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+
+    async def fetch_batch(batch):
+        params = {
+            "latitude": ",".join(str(lat) for lat, _ in batch),
+            "longitude": ",".join(str(lon) for _, lon in batch),
+            "hourly": HOURLY_VARIABLES,
+            "forecast_days": 1,
+        }
+        try:
+            response = await fetch_json(client, base_url, params, limiter, semaphore)
+        except Exception as e:
+            logging.error(f"Failed to download weather data for {len(batch)} points: {e}")
+            return []
+        # A single location is returned as an object, several as a list.
+        locations = response if isinstance(response, list) else [response]
+        for (lat, lon), location in zip(batch, locations):
+            location["latitude"], location["longitude"] = lat, lon
+        return locations
+
+    results = await asyncio.gather(*(fetch_batch(batch) for batch in batches))
+    return [location for locations in results for location in locations]
+
+
+async def fetch_forex(client, devices, limiter, semaphore, base_url=ALPHA_VANTAGE_URL, api_key=API_KEY):
+    """
+    Fetch the USD exchange rate of every device.
+
+    Returns:
+        dict: Alpha Vantage responses keyed by device (the devices that failed are left out).
+    """
+    async def fetch_device(device):
+        params = {
+            "function": "CURRENCY_EXCHANGE_RATE",
+            "from_currency": "USD",
+            "to_currency": device,
+            "apikey": api_key,
+        }
+        try:
+            response = await fetch_json(client, base_url, params, limiter, semaphore)
+        except Exception as e:
+            logging.error(f"Failed to download forex data for {device}: {e}")
+            return None
+        if "Realtime Currency Exchange Rate" not in response:
+            # Alpha Vantage reports errors and rate limits with a 200 response.
+            logging.error(f"Unexpected forex response for {device}: {response}")
+            return None
+        return response
+
+    responses = await asyncio.gather(*(fetch_device(device) for device in devices))
+    return {device: response for device, response in zip(devices, responses) if response is not None}
+
+
+def write_json(data, directory, name):
+    """
+    Write a consolidated file atomically (written under a temporary name, then renamed), so
+    that a reader never sees a partial file.
+
+    Returns:
+        str: Path of the file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+async def collect(sources, raw_dir=RAW_DIR, weather_url=OPEN_METEO_URL, forex_url=ALPHA_VANTAGE_URL,
+                  concurrency=COLLECTOR_CONCURRENCY, weather_rate=OPEN_METEO_RATE, forex_rate=ALPHA_VANTAGE_RATE):
+    """
+    Download the data of 'sources' ("weather", "forex") concurrently with one pooled HTTP client,
+    and write one consolidated file per source.
+
+    Returns:
+        dict: Path of the file written for each source (None if nothing was downloaded).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    paths = {}
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        tasks = {}
+        if "weather" in sources:
+            tasks["weather"] = fetch_weather(client, grid_points(), TokenBucket(weather_rate, OPEN_METEO_BURST), semaphore, weather_url)
+        if "forex" in sources:
+            tasks["forex"] = fetch_forex(client, DEVICES, TokenBucket(forex_rate, ALPHA_VANTAGE_BURST), semaphore, forex_url)
+        results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+
+    if "weather" in results:
+        locations = results["weather"]
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        paths["weather"] = write_json(locations, os.path.join(raw_dir, "weather"), f"weather_data_{timestamp}.json") if locations else None
+        logging.info(f"Weather data of {len(locations)} points saved to {paths['weather']}")
+    if "forex" in results:
+        rates = results["forex"]
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        paths["forex"] = write_json(rates, os.path.join(raw_dir, "forex_data"), f"forex_data_{timestamp}.json") if rates else None
+        logging.info(f"Forex data of {len(rates)} devices saved to {paths['forex']}")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download weather and forex data.")
+    parser.add_argument("sources", nargs="*", choices=["weather", "forex"], default=["weather", "forex"])
+    args = parser.parse_args()
+
+    paths = asyncio.run(collect(args.sources))
+    sys.exit(0 if all(paths.values()) else 1)
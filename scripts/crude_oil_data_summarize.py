@@ -1,8 +1,12 @@
 import os 
 import json
-from pymongo import MongoClient 
+from pymongo import MongoClient, UpdateOne, DESCENDING
 from dotenv import load_dotenv
 import pandas as pd
+from mongo_indexes import ensure_indexes
+from raw_files import list_raw_files, open_raw_file, iter_json_array, chunked
+from archive import archive_rows
+from crude_rollups import rollup_rows
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
 DATA_DIR = os.path.join(script_dir, "../data/raw/crude_oil")
@@ -13,21 +17,19 @@ load_dotenv()
 mongo_uri = os.getenv("MONGO_URI")
 db_name =  os.getenv("DB_NAME")
 collection_name = os.getenv("CRUDE_COLLECTION_NAME")
+# Collection des agrégats par semaine, mois et année (facultative, voir crude_rollups.py).
+rollup_collection_name = os.getenv("CRUDE_ROLLUP_COLLECTION_NAME")
 
-if not mongo_uri or not db_name or not collection_name:
-    raise ValueError("Une ou plusieurs variables d'environnement sont manquantes.")
+# Nombre d'opérations envoyées par appel à bulk_write.
+BULK_BATCH_SIZE = 1000
 
+# Nombre d'enregistrements lus, prétraités et écrits à la fois : la mémoire utilisée dépend de
+# cette taille et non de celle du fichier.
+CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 10000))
 
+# Traiter aussi les fichiers .json.gz (fichiers anciens compressés par les collecteurs).
+INCLUDE_GZIP = os.getenv("INGEST_INCLUDE_GZIP", "0") == "1"
 
-client = MongoClient(mongo_uri)
-crude_oil_db = client[db_name]
-crude_oil_collection = crude_oil_db[collection_name]
-
-def data_exists(date, value):
-    """Vérifie si les données existent déjà dans la base MongoDB en fonction de la date et de la valeur."""
-    return crude_oil_collection.find_one({"date": date, "value": value}) is not None
-
-    
 def preprocess_dataframe(df):
     """Prétraite les données : convertir la date et la valeur, et supprime les prifs négatifs"""
     df["date"] = pd.to_datetime(df["date"], errors='coerce')
@@ -38,76 +40,191 @@ def preprocess_dataframe(df):
     df = df[df['value'] >= 0]
     return df
 
-def create_missing_dates(df):
-    """Crée les dates manquantes pour combler l'intervalle entre les dates."""
-    full_date_range = pd.date_range(start=df["date"].min(), end=pd.to_datetime('today'), freq='D')
-    missing_dates = full_date_range.difference(df["date"])
-    missing_df = pd.DataFrame(missing_dates, columns=["date"])
-    missing_df['value'] = None  
-    missing_df["year"] = missing_df["date"].dt.year
-    missing_df["month"] = missing_df["date"].dt.month
-    return missing_df
-
-def combine_and_sort_data(df, missing_df):
-    """Combine les données existantes avec les dates manquantes et les trie."""
-    df = df.dropna(how="all", axis=1)
-    missing_df = missing_df.dropna(how="all", axis=1)
-    combined_df = pd.concat([df, missing_df], ignore_index=True)
-    combined_df = combined_df.sort_values(by="date")
-    combined_df["_id"] = range(1, len(combined_df) + 1)
-    return combined_df
-
-def interpolate_missing_values(df):
-    """Interpole les valeurs manquantes dans le DataFrame."""
-    df['value'] = df['value'].interpolate()
+def read_chunks(file_path, chunk_size=CHUNK_SIZE):
+    """
+    Lit le tableau 'data' d'un fichier JSON (éventuellement compressé en .gz) de façon incrémentale
+    et produit des DataFrames d'au plus chunk_size enregistrements : le fichier n'est jamais chargé
+    en entier en mémoire.
+    """
+    with open_raw_file(file_path) as f:
+        for records in chunked(iter_json_array(f, "data"), chunk_size):
+            yield pd.DataFrame(records, columns=["date", "value"])
+
+def preprocess_chunks(chunks):
+    """Prétraite chaque bloc (voir preprocess_dataframe)."""
+    for df in chunks:
+        yield preprocess_dataframe(df)
+
+def load_anchor(collection):
+    """
+    Retourne le dernier jour observé (et non interpolé) stocké dans la collection, sous forme d'un
+    DataFrame (date, value) d'une ligne, ou None si la collection est vide. L'index sur 'date' est
+    parcouru depuis la fin : seuls les jours interpolés depuis ce jour sont lus.
+    """
+    document = collection.find_one(
+        {"interpolated": {"$ne": True}, "value": {"$ne": None}},
+        {"_id": 0, "date": 1, "value": 1},
+        sort=[("date", DESCENDING)],
+    )
+    if document is None:
+        return None
+    return pd.DataFrame({"date": [pd.Timestamp(document["date"])], "value": [float(document["value"])]})
+
+def since(chunks, start):
+    """
+    Ne garde que les jours postérieurs à 'start'.
+    Les fichiers d'Alpha Vantage sont triés par date décroissante : dès qu'un bloc trié ainsi
+    atteint 'start', le reste du fichier (plus ancien) n'est pas lu.
+    """
+    for df in chunks:
+        dates = df["date"].dropna()
+        newer = df[df["date"] > start]
+        if not newer.empty:
+            yield newer
+        if len(dates) > 1 and dates.is_monotonic_decreasing and dates.iloc[-1] <= start:
+            return
+
+def fill_gaps(chunks, anchor=None, end=None):
+    """
+    Crée les dates manquantes et interpole les valeurs, bloc par bloc.
+    - 'anchor' (voir load_anchor) est le dernier jour observé déjà stocké : l'interpolation part de
+      lui et il n'est pas réécrit.
+    - Le dernier jour (dans l'ordre du fichier) de chaque bloc sert d'ancre au bloc suivant, ce qui
+      comble aussi les trous entre deux blocs, que le fichier soit trié par date croissante ou
+      décroissante.
+    - Après le dernier bloc, les jours jusqu'à 'end' (aujourd'hui par défaut) reprennent la
+      dernière valeur connue.
+    - Les jours créés ici ont la colonne 'interpolated' à True.
+    """
+    end = pd.Timestamp.today().normalize() if end is None else end
+    latest = anchor
+    for df in chunks:
+        df = df[df["date"].notna()]
+        if df.empty:
+            continue
+        frame = df if anchor is None else pd.concat([anchor, df], ignore_index=True)
+        daily = frame.groupby("date")["value"].last()
+        daily = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq="D")).interpolate()
+        if anchor is not None:
+            daily = daily.drop(anchor["date"].iloc[0])
+        observed = daily.index.isin(df["date"])
+        anchor = df.iloc[[-1]][["date", "value"]]
+        newest = df.loc[[df["date"].idxmax()], ["date", "value"]]
+        if latest is None or newest["date"].iloc[0] > latest["date"].iloc[0]:
+            latest = newest
+        yield _daily_frame(daily, ~observed)
+
+    if latest is not None and latest["date"].iloc[0] < end:
+        dates = pd.date_range(latest["date"].iloc[0] + pd.Timedelta(days=1), end, freq="D")
+        yield _daily_frame(pd.Series(latest["value"].iloc[0], index=dates), True)
+
+def _daily_frame(daily, interpolated):
+    """Construit le DataFrame (date, value, year, month, interpolated) d'une série indexée par jour."""
+    df = pd.DataFrame({"date": daily.index, "value": daily.to_numpy(dtype=float), "interpolated": interpolated})
+    df["year"] = df["date"].dt.year
+    df["month"] = df["date"].dt.month
     return df
 
-def process_file(file_path):
-    """Traite un fichier JSON, le prétraite et retourne un DataFrame."""
-    with open(file_path, "r") as f:
+def process_file(file_path, chunk_size=CHUNK_SIZE, anchor=None):
+    """
+    Traite un fichier JSON en flux : lecture par blocs -> prétraitement -> jours postérieurs à
+    l'ancre -> dates manquantes et interpolation depuis l'ancre. Retourne un générateur de
+    DataFrames prêts à être écrits dans MongoDB. Sans ancre, tout l'historique du fichier est traité.
+    """
+    chunks = preprocess_chunks(read_chunks(file_path, chunk_size))
+    if anchor is not None:
+        chunks = since(chunks, anchor["date"].iloc[0])
+    return fill_gaps(chunks, anchor=anchor)
+
+def build_upserts(df):
+    """
+    Construit une opération UpdateOne(upsert=True) par jour, à partir des colonnes du DataFrame
+    (sans iterrows). La date est la clé : relancer le script ne crée jamais de doublon.
+    """
+    df = df[df["date"].notna()]
+    dates = df["date"].dt.to_pydatetime()
+    values = df["value"].astype(float).tolist()
+    years = df["year"].astype(int).tolist()
+    months = df["month"].astype(int).tolist()
+    interpolated = df["interpolated"].astype(bool).tolist()
+    return [
+        UpdateOne(
+            {"date": date},
+            {"$set": {"value": value, "year": year, "month": month, "interpolated": filled}},
+            upsert=True,
+        )
+        for date, value, year, month, filled in zip(dates, values, years, months, interpolated)
+    ]
+
+def upsert_crude_oil_data(collection, df, rollups=None):
+    """
+    Écrit les données dans la collection par lots non ordonnés de BULK_BATCH_SIZE upserts, puis
+    dans l'archive en colonnes (voir archive.py). Si 'rollups' est donnée, les agrégats des
+    périodes contenant ces jours y sont recalculés (voir crude_rollups.py).
+    Retourne le nombre de jours insérés et le nombre de jours modifiés.
+    """
+    operations = build_upserts(df)
+    inserted, modified = 0, 0
+    for start in range(0, len(operations), BULK_BATCH_SIZE):
+        result = collection.bulk_write(operations[start:start + BULK_BATCH_SIZE], ordered=False)
+        inserted += result.upserted_count
+        modified += result.modified_count
+    archive_rows("crude_oil", df)
+    rollup_rows(collection, rollups, df)
+    return inserted, modified
+
+def ingest_file(collection, file_path, rollups=None):
+    """
+    Écrit dans la collection les jours d'un fichier postérieurs au dernier jour observé en base.
+    Retourne le nombre de jours insérés et le nombre de jours modifiés.
+    """
+    inserted, modified = 0, 0
+    anchor = load_anchor(collection)
+    for df in process_file(file_path, anchor=anchor):
+        chunk_inserted, chunk_modified = upsert_crude_oil_data(collection, df, rollups)
+        inserted += chunk_inserted
+        modified += chunk_modified
+    return inserted, modified
+
+def load_and_process_crude_oil_data(collection, files=None, rollups=None):
+    """
+    Charge et traite les fichiers (par défaut, ceux de DATA_DIR), les stocke dans MongoDB (et
+    met à jour les agrégats de 'rollups') puis les supprime. Un fichier illisible ou dont
+    l'écriture a échoué est conservé.
+    """
+    if files is None:
+        files = list_raw_files(DATA_DIR, include_gzip=INCLUDE_GZIP)
+    for file_path in files:
+        file_name = os.path.basename(file_path)
         try:
-            file_data = json.load(f)
-        except json.JSONDecodeError:
-            print(f"Erreur de lecture du fichier JSON : {file_path}")
-    df = pd.DataFrame(file_data['data'])
-    df = preprocess_dataframe(df)
-    missing_df = create_missing_dates(df)
-    df = combine_and_sort_data(df, missing_df)
-    df = interpolate_missing_values(df)
-    return df
-
-def load_and_process_crude_oil_data():
-    """Charge et traite les données, puis les stocke dans MongoDB."""
-    for file_name in os.listdir(DATA_DIR):
-        if file_name.endswith(".json"):
-            file_path = os.path.join(DATA_DIR, file_name)
-            df = process_file(file_path)
-            
-            if df is not None:
-                new_records = []
-                for _, row in df.iterrows():
-                    date = row["date"]
-                    value = row["value"]
-                    if not data_exists(date, value):  
-                        new_records.append(row.to_dict())
-
-                if new_records:
-                    try:
-                        crude_oil_collection.insert_many(new_records)
-                        print(f"Inséré {len(new_records)} nouvelles données depuis {file_path}")
-                    except Exception as e:
-                        print(f"Erreur lors de l'insertion dans MongoDB : {e}")
-                else:
-                    print(f"Aucune nouvelle donnée à insérer depuis {file_path}")
-                
-            
-                try:
-                    os.remove(file_path)
-                    print(f"Fichier supprimé : {file_name}")
-                except Exception as e:
-                    print(f"Erreur lors de la suppression du fichier {file_name}: {e}")
-
-
-load_and_process_crude_oil_data()
-
+            inserted, modified = ingest_file(collection, file_path, rollups)
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Erreur de lecture du fichier JSON : {file_path} ({e})")
+            continue
+        except Exception as e:
+            # Le fichier est conservé : il sera traité à nouveau au prochain passage.
+            print(f"Erreur lors de l'insertion dans MongoDB : {e}")
+            continue
+        else:
+            if inserted or modified:
+                print(f"Inséré {inserted} et mis à jour {modified} jours depuis {file_path}")
+            else:
+                print(f"Aucune nouvelle donnée à insérer depuis {file_path}")
 
+        try:
+            os.remove(file_path)
+            print(f"Fichier supprimé : {file_name}")
+        except Exception as e:
+            print(f"Erreur lors de la suppression du fichier {file_name}: {e}")
+
+
+if __name__ == "__main__":
+    if not mongo_uri or not db_name or not collection_name:
+        raise ValueError("Une ou plusieurs variables d'environnement sont manquantes.")
+
+    client = MongoClient(mongo_uri)
+    crude_oil_db = client[db_name]
+    ensure_indexes(crude_oil_db)
+    rollups = crude_oil_db[rollup_collection_name] if rollup_collection_name else None
+    load_and_process_crude_oil_data(crude_oil_db[collection_name], rollups=rollups)
+    client.close()
@@ -0,0 +1,149 @@
+import os
+import logging
+import pandas as pd
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+
+
+# Resolutions of the rollups of the crude oil prices, with the pandas period of each. The daily
+# resolution is the crude oil collection itself (one document per day).
+RESOLUTIONS = {
+    "week": "W-SUN",
+    "month": "M",
+    "year": "Y",
+}
+
+# Fields of a rollup document, besides its key (resolution, period):
+# - "open" / "close": price of the first / last day of the period.
+# - "high" / "low": max / min price of the period.
+# - "mean" and "count": mean price and number of days with a price.
+# - "last_date": last day of the period with a price (high-water mark of the dashboard).
+ROLLUP_FIELDS = ["open", "high", "low", "close", "mean", "count", "last_date"]
+
+# Number of operations sent per bulk_write call.
+BULK_BATCH_SIZE = 1000
+
+
+def compute_rollups(df):
+    """
+    Compute the rollups of every resolution from daily prices.
+
+    Args:
+        df (pd.DataFrame): Daily prices ('date', 'value'); days without a price are ignored.
+
+    Returns:
+        pd.DataFrame: One row per (resolution, period), 'period' being the first day of the
+        period, with the ROLLUP_FIELDS columns.
+    """
+    df = df[df["date"].notna() & df["value"].notna()].sort_values("date")
+    frames = []
+    for resolution, freq in RESOLUTIONS.items():
+        groups = df.groupby(df["date"].dt.to_period(freq).dt.start_time.rename("period"))
+        rollups = groups["value"].agg(
+            open="first", high="max", low="min", close="last", mean="mean", count="count"
+        )
+        rollups["last_date"] = groups["date"].max()
+        rollups = rollups.reset_index()
+        rollups.insert(0, "resolution", resolution)
+        frames.append(rollups)
+    return pd.concat(frames, ignore_index=True)
+
+
+def update_rollups(collection, rollups, start, end):
+    """
+    Rebuild the rollups of the periods holding a day between 'start' and 'end' (inclusive), from
+    the daily documents of the crude oil collection. Called after days were written: only the
+    periods they belong to are read and rewritten, and rewriting a day (e.g. an interpolated day
+    replaced by an observed one) updates its rollups instead of counting it twice.
+
+    Args:
+        collection (pymongo.collection.Collection): Crude oil collection (one document per day).
+        rollups (pymongo.collection.Collection): Rollup collection, keyed by (resolution, period).
+        start, end (datetime): First and last day written.
+
+    Returns:
+        int: Number of rollup documents written.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    # The periods of the coarsest resolution (years) hold those of the others.
+    first = pd.Timestamp(year=start.year, month=1, day=1)
+    last = pd.Timestamp(year=end.year + 1, month=1, day=1)
+    documents = list(collection.find(
+        {"date": {"$gte": first.to_pydatetime(), "$lt": last.to_pydatetime()}},
+        {"_id": 0, "date": 1, "value": 1},
+    ))
+    if not documents:
+        return 0
+    days = pd.DataFrame(documents, columns=["date", "value"])
+    days["date"] = pd.to_datetime(days["date"])
+    days["value"] = pd.to_numeric(days["value"], errors="coerce")
+
+    df = compute_rollups(days)
+    touched = [
+        (df["resolution"] == resolution) & (df["period"] <= end)
+        & (df["period"].dt.to_period(freq).dt.end_time >= start)
+        for resolution, freq in RESOLUTIONS.items()
+    ]
+    df = df[pd.concat(touched, axis=1).any(axis=1)]
+
+    operations = build_upserts(df)
+    for i in range(0, len(operations), BULK_BATCH_SIZE):
+        rollups.bulk_write(operations[i:i + BULK_BATCH_SIZE], ordered=False)
+    return len(operations)
+
+
+def build_upserts(df):
+    """Build one UpdateOne(upsert=True) per rollup, keyed by (resolution, period)."""
+    periods = df["period"].dt.to_pydatetime()
+    last_dates = df["last_date"].dt.to_pydatetime()
+    values = {field: df[field].astype(float).tolist() for field in ["open", "high", "low", "close", "mean"]}
+    counts = df["count"].astype(int).tolist()
+    return [
+        UpdateOne(
+            {"resolution": resolution, "period": period},
+            {"$set": {
+                **{field: values[field][i] for field in values},
+                "count": counts[i],
+                "last_date": last_dates[i],
+            }},
+            upsert=True,
+        )
+        for i, (resolution, period) in enumerate(zip(df["resolution"].tolist(), periods))
+    ]
+
+
+def rollup_rows(collection, rollups, df):
+    """
+    Update the rollups of the days of 'df' ('date' column) just written to the crude oil
+    collection, logging failures: the rollups never make an ingestion fail.
+    """
+    dates = df["date"].dropna()
+    if rollups is None or dates.empty:
+        return
+    try:
+        update_rollups(collection, rollups, dates.min(), dates.max())
+    except Exception as e:
+        logging.error(f"Failed to update the crude oil rollups of {len(dates)} days: {e}")
+
+
+def rebuild(collection, rollups):
+    """Rebuild every rollup from the crude oil collection (backfill of the days ingested before)."""
+    first = collection.find_one({}, {"_id": 0, "date": 1}, sort=[("date", 1)])
+    last = collection.find_one({}, {"_id": 0, "date": 1}, sort=[("date", -1)])
+    if first is None:
+        return 0
+    return update_rollups(collection, rollups, first["date"], last["date"])
+
+
+if __name__ == "__main__":
+    load_dotenv(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".env"))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if not os.getenv("CRUDE_ROLLUP_COLLECTION_NAME"):
+        raise ValueError("CRUDE_ROLLUP_COLLECTION_NAME is not set.")
+
+    client = MongoClient(os.getenv("MONGO_URI"))
+    db = client[os.getenv("DB_NAME")]
+    written = rebuild(db[os.getenv("CRUDE_COLLECTION_NAME")], db[os.getenv("CRUDE_ROLLUP_COLLECTION_NAME")])
+    logging.info(f"Rebuilt {written} crude oil rollups.")
+    client.close()
@@ -1,7 +1,13 @@
 import os 
 import json
-from pymongo import MongoClient 
+import logging
+import pandas as pd
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 from dotenv import load_dotenv
+from mongo_indexes import ensure_indexes
+from raw_files import list_raw_files
+from archive import archive_rows
 
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
@@ -16,63 +22,107 @@ collection_name = os.getenv("FOREX_COLLECTION_NAME")
 
 
 
-client = MongoClient(mongo_uri)
-forex_db = client[db_name]
-forex_collection = forex_db[collection_name]
-
-# Fonction pour insérer ou remplacer les données
-def upsert_exchange_rates(collection, data):
+# Fonction pour ajouter les données à l'historique
+def insert_exchange_rates(collection, data):
     """
-    Insert or update exchange rate data in the MongoDB collection.
+    Append exchange rate quotes to the history stored in the MongoDB collection.
+    - One unordered bulk write for all the records.
+    - A quote already stored for the same (device, last_refreshed) is left untouched, so
+      processing a file twice does not create duplicates.
+    - The quotes are also merged into the columnar archive (see archive.py).
 
     Args:
         collection (MongoClient collection): The MongoDB collection where the data will be inserted.
-        data (list of dict): A list of dictionaries containing exchange rate data to be upserted.
+        data (list of dict): A list of dictionaries containing exchange rate data to be inserted.
+
+    Returns:
+        int: Number of new quotes stored.
     """
-    for record in data:
-        collection.replace_one(
-            {"device": record["device"]},  
-            record,  
-            upsert=True  
+    if not data:
+        return 0
+    operations = [
+        UpdateOne(
+            {"device": record["device"], "last_refreshed": record["last_refreshed"]},
+            {"$setOnInsert": record},
+            upsert=True
         )
+        for record in data
+    ]
+    result = collection.bulk_write(operations, ordered=False)
+    archive_rows("forex", pd.DataFrame(data))
+    return result.upserted_count
 
-def process_file(file_path):
+def process_file(collection, file_path):
     """
-    Process a single JSON file, extract relevant exchange rate data, and upsert it to MongoDB.
+    Process a single JSON file, extract relevant exchange rate data, and append it to MongoDB.
 
     Args:
+        collection (MongoClient collection): The MongoDB collection holding the history.
         file_path (str): Path to the JSON file to be processed.
 
     Returns:
-        None
+        bool: False if the file cannot be parsed (e.g. still being written, or an error or rate
+        limit message of the API instead of the quotes), True once its quotes are stored.
     """
     with open(file_path, "r") as f:
         try:
             file_data = json.load(f)
         except json.JSONDecodeError:
-            print(f"Erreur de lecture du fichier JSON : {file_path}")
+            logging.error(f"Erreur de lecture du fichier JSON : {file_path}")
+            return False
 
     extracted_data = []
-    for currency, details in file_data.items():
-        exchange_info = details["Realtime Currency Exchange Rate"]
-        device = exchange_info["3. To_Currency Code"]
-        exchange_rate = exchange_info["5. Exchange Rate"]
-        last_refreshed = exchange_info["6. Last Refreshed"]
-
-        extracted_data.append({
-            "device": device,
-            "exchange_rate": exchange_rate,
-            "last_refreshed": last_refreshed
-        })
+    try:
+        for currency, details in file_data.items():
+            exchange_info = details["Realtime Currency Exchange Rate"]
+            device = exchange_info["3. To_Currency Code"]
+            exchange_rate = exchange_info["5. Exchange Rate"]
+            last_refreshed = exchange_info["6. Last Refreshed"]
+
+            extracted_data.append({
+                "device": device,
+                "exchange_rate": exchange_rate,
+                "last_refreshed": last_refreshed
+            })
+    except (KeyError, TypeError, AttributeError) as e:
+        # Réponse d'erreur ou de limite de requêtes de l'API : le fichier est conservé.
+        logging.error(f"Taux de change absents du fichier {file_path} : {e!r}")
+        return False
     
-    upsert_exchange_rates(forex_collection, extracted_data)
+    inserted = insert_exchange_rates(collection, extracted_data)
+    logging.info(f"{inserted} nouveaux taux enregistrés depuis {file_path}")
+    return True
     
 
 
-for file_name in os.listdir(DATA_DIR):
-    if file_name.endswith(".json"):
-        file_path = os.path.join(DATA_DIR, file_name)
-        process_file(file_path)
+def load_and_process_forex_data(collection, files=None):
+    """
+    Process the files (by default, those of DATA_DIR), append their quotes to MongoDB and delete them.
+    A file that cannot be parsed or stored is kept, to be processed again on the next run; the
+    other files are processed anyway.
+
+    Args:
+        collection (MongoClient collection): The MongoDB collection holding the history.
+        files (list of str): Paths of the files to process.
+    """
+    if files is None:
+        files = list_raw_files(DATA_DIR)
+    for file_path in files:
+        try:
+            if not process_file(collection, file_path):
+                continue
+        except BulkWriteError as e:
+            logging.error(f"Erreur lors de l'insertion dans MongoDB depuis {file_path} : {e}")
+            continue
 
         os.remove(file_path)
-        print(f"fichier supprimé : {file_name}")
\ No newline at end of file
+        logging.info(f"fichier supprimé : {os.path.basename(file_path)}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    client = MongoClient(mongo_uri)
+    forex_db = client[db_name]
+    ensure_indexes(forex_db)
+    load_and_process_forex_data(forex_db[collection_name])
+    client.close()
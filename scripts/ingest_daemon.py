@@ -0,0 +1,156 @@
+import os
+import time
+import logging
+from pymongo import MongoClient
+from dotenv import load_dotenv
+from watchfiles import watch, Change
+
+import crude_oil_data_summarize as crude_oil
+import forex_data_summarize as forex
+import weather_data_summarize as weather
+from mongo_indexes import ensure_indexes
+from raw_files import list_raw_files
+
+# Load environment variables from the .env file
+script_dir = os.path.dirname(os.path.realpath(__file__))
+load_dotenv(os.path.join(script_dir, ".env"))
+
+RAW_DIR = os.path.join(script_dir, "../data/raw")
+
+# Raw data directory (under RAW_DIR) and collection (environment variable) of each source.
+SOURCES = {
+    "crude_oil": ("crude_oil", "CRUDE_COLLECTION_NAME"),
+    "forex": ("forex_data", "FOREX_COLLECTION_NAME"),
+    "weather": ("weather", "WEATHER_COLLECTION_NAME"),
+}
+
+# A batch is closed once no file has changed for INGEST_QUIET_MS, or INGEST_BATCH_WINDOW ms after
+# its first change, so that the files of a collector run are ingested together.
+INGEST_QUIET_MS = int(os.getenv("INGEST_QUIET_MS", 500))
+INGEST_BATCH_WINDOW = int(os.getenv("INGEST_BATCH_WINDOW", 5000))
+
+# A file is only ingested once it has not been modified for INGEST_SETTLE_SECONDS: the shell
+# collectors write their files in several steps (e.g. one currency per curl call).
+INGEST_SETTLE_SECONDS = float(os.getenv("INGEST_SETTLE_SECONDS", 30))
+
+# Also ingest the '*.json.gz' files (old files compressed by the collectors).
+INCLUDE_GZIP = os.getenv("INGEST_INCLUDE_GZIP", "0") == "1"
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class IngestionService:
+    """
+    Resident ingestion of the raw data files, as an alternative to running the three summarize
+    scripts from cron.
+    - Watches the raw data directories and ingests every file as soon as it lands, with the
+      functions of the summarize scripts, through a single pooled MongoClient.
+    - Files arriving in a burst (e.g. one run of a collector) are ingested as one micro-batch:
+      the weather files of a batch are summarized together and folded with a single bulk write.
+    - Files modified less than 'settle_seconds' ago may still be being written: they are
+      deferred and retried once they have settled.
+    - A file is only deleted once it has been parsed and stored; a file that cannot be parsed
+      is left in place and retried on its next change.
+    """
+
+    def __init__(self, db, raw_dir=RAW_DIR, include_gzip=INCLUDE_GZIP, settle_seconds=INGEST_SETTLE_SECONDS):
+        self.include_gzip = include_gzip
+        self.settle_seconds = settle_seconds
+        self.deferred = set()
+        self.directories = {}
+        self.collections = {}
+        for name, (directory, env_name) in SOURCES.items():
+            self.directories[name] = os.path.realpath(os.path.join(raw_dir, directory))
+            self.collections[name] = db[os.getenv(env_name)]
+            os.makedirs(self.directories[name], exist_ok=True)
+        # Rollups of the crude oil prices, updated at ingest (optional, see crude_rollups.py).
+        rollup_collection_name = os.getenv("CRUDE_ROLLUP_COLLECTION_NAME")
+        self.crude_oil_rollups = db[rollup_collection_name] if rollup_collection_name else None
+
+    def is_raw_file(self, path):
+        """Return True for the files ingested by the service."""
+        return path.endswith(".json") or (self.include_gzip and path.endswith(".json.gz"))
+
+    def pending_files(self):
+        """Return the files already waiting in the raw data directories."""
+        return [
+            path
+            for directory in self.directories.values()
+            for path in list_raw_files(directory, include_gzip=self.include_gzip)
+        ]
+
+    def ingest(self, files):
+        """
+        Ingest a batch of files, grouped by source, with the deferred files that have settled since.
+        An error on a source is logged and does not stop the ingestion of the others.
+        """
+        batches = {name: [] for name in SOURCES}
+        now = time.time()
+        for path in sorted(set(files) | self.deferred):
+            try:
+                modified = os.path.getmtime(path)
+            except OSError:
+                # Deleted (or renamed) since the change event.
+                self.deferred.discard(path)
+                continue
+            if now - modified < self.settle_seconds:
+                self.deferred.add(path)
+                continue
+            self.deferred.discard(path)
+            for name, directory in self.directories.items():
+                if os.path.dirname(os.path.realpath(path)) == directory:
+                    batches[name].append(path)
+
+        for name, paths in batches.items():
+            if not paths:
+                continue
+            logging.info(f"Ingesting {len(paths)} {name} file(s).")
+            try:
+                if name == "crude_oil":
+                    crude_oil.load_and_process_crude_oil_data(
+                        self.collections[name], paths, rollups=self.crude_oil_rollups
+                    )
+                elif name == "forex":
+                    forex.load_and_process_forex_data(self.collections[name], paths)
+                else:
+                    failed = []
+                    weather.ingest_files(self.collections[name], paths, failed=failed)
+                    weather.cleanup_files([path for path in paths if path not in failed])
+            except Exception as e:
+                logging.error(f"Failed to ingest {name} files: {e}")
+
+    def run(self, stop_event=None):
+        """
+        Ingest the pending files, then the files created or modified in the raw data directories,
+        until 'stop_event' (a threading.Event) is set or the process is interrupted. Without any
+        change, the watch times out every 'settle_seconds' to ingest the deferred files.
+        """
+        self.ingest(self.pending_files())
+
+        def watch_filter(change, path):
+            return change != Change.deleted and self.is_raw_file(path)
+
+        for changes in watch(
+            *self.directories.values(),
+            watch_filter=watch_filter,
+            debounce=INGEST_BATCH_WINDOW,
+            step=INGEST_QUIET_MS,
+            stop_event=stop_event,
+            rust_timeout=int(self.settle_seconds * 1000) or 1000,
+            yield_on_timeout=True,
+        ):
+            self.ingest([path for _, path in changes if os.path.exists(path)])
+
+
+if __name__ == "__main__":
+    client = MongoClient(os.getenv("MONGO_URI"))
+    db = client[os.getenv("DB_NAME")]
+    ensure_indexes(db)
+
+    logging.info("Watching the raw data directories.")
+    try:
+        IngestionService(db).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
@@ -0,0 +1,148 @@
+import os
+import logging
+from pymongo import MongoClient, UpdateOne, DeleteMany, DESCENDING
+from dotenv import load_dotenv
+
+
+def flag_legacy_filled_days(collection):
+    """
+    Flag the crude oil days forward-filled by the former summarize script.
+    - That script stored every day up to its run date, the days after the last observed price
+      repeating it, without the 'interpolated' field: the last of them would otherwise be taken
+      as the last observed day (see load_anchor) and the real prices up to it never ingested.
+    - The trailing run of legacy days repeating the same value is flagged as interpolated,
+      except its first day (the observation); the other legacy days are flagged as observed.
+    - A no-op once no document lacks the field.
+
+    Args:
+        collection (pymongo.collection.Collection): Crude oil collection (one document per day).
+
+    Returns:
+        int: Number of days flagged as interpolated.
+    """
+    legacy = {"interpolated": {"$exists": False}}
+    if collection.find_one(legacy, {"_id": 1}) is None:
+        return 0
+
+    filled, value = [], None
+    for document in collection.find(legacy, {"_id": 0, "date": 1, "value": 1}, sort=[("date", DESCENDING)]):
+        if filled and document["value"] != value:
+            break
+        value = document["value"]
+        filled.append(document["date"])
+    # The oldest day of the run is the observed price the others repeat.
+    filled = filled[:-1]
+
+    if filled:
+        collection.update_many({"date": {"$in": filled}}, {"$set": {"interpolated": True}})
+    collection.update_many(legacy, {"$set": {"interpolated": False}})
+    return len(filled)
+
+
+# Variables of the weather summaries written before the mergeable aggregates, as the daily mean
+# ('temperature') and max ('wind_speed') of one run.
+LEGACY_WEATHER_VARIABLES = ["temperature", "wind_speed"]
+
+# Number of operations sent per bulk_write call.
+BULK_BATCH_SIZE = 1000
+
+
+def fold_legacy_weather_summaries(collection):
+    """
+    Fold the weather summaries written before the mergeable aggregates into one document per
+    (region, day), so that the unique index on (region, day) can be built.
+    - The former script inserted one document per run, holding the mean temperature and max wind
+      speed of the day: a day summarized by several runs has several documents.
+    - Each legacy document counts as one value of each variable (count 1, sum and max its value);
+      a document that already holds aggregates (folded into by the current script) contributes
+      them instead. The folded aggregates are set on one document of the day, the legacy fields
+      are removed from it and the other documents are deleted.
+    - A no-op once no document holds the legacy fields.
+
+    Args:
+        collection (pymongo.collection.Collection): Weather collection.
+
+    Returns:
+        int: Number of legacy documents folded.
+    """
+    legacy = {"$or": [{variable: {"$exists": True}} for variable in LEGACY_WEATHER_VARIABLES]}
+    if collection.find_one(legacy, {"_id": 1}) is None:
+        return 0
+
+    days = {}
+    migrated = 0
+    for document in collection.find(legacy):
+        days.setdefault((document.get("region"), document.get("day")), []).append(document)
+        migrated += 1
+
+    operations = []
+    for documents in days.values():
+        folded = {}
+        for variable in LEGACY_WEATHER_VARIABLES:
+            count, total, maximum = 0, 0.0, None
+            for document in documents:
+                if document.get(f"{variable}_count"):
+                    values = (document[f"{variable}_count"], document.get(f"{variable}_sum", 0.0), document.get(f"{variable}_max"))
+                elif _is_number(document.get(variable)):
+                    values = (1, document[variable], document[variable])
+                else:
+                    continue
+                count += values[0]
+                total += values[1]
+                if _is_number(values[2]) and (maximum is None or values[2] > maximum):
+                    maximum = values[2]
+            folded.update({f"{variable}_count": count, f"{variable}_sum": total, f"{variable}_max": maximum})
+
+        operations.append(UpdateOne(
+            {"_id": documents[0]["_id"]},
+            {"$set": folded, "$unset": {variable: "" for variable in LEGACY_WEATHER_VARIABLES}},
+        ))
+        if len(documents) > 1:
+            operations.append(DeleteMany({"_id": {"$in": [document["_id"] for document in documents[1:]]}}))
+
+    for start in range(0, len(operations), BULK_BATCH_SIZE):
+        collection.bulk_write(operations[start:start + BULK_BATCH_SIZE], ordered=False)
+    return migrated
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and value == value
+
+
+# One-off migrations of the documents written by former versions of the scripts, keyed by the
+# environment variable holding the collection name. They run before the indexes are built.
+MIGRATIONS = {
+    "CRUDE_COLLECTION_NAME": [flag_legacy_filled_days],
+    "WEATHER_COLLECTION_NAME": [fold_legacy_weather_summaries],
+}
+
+
+def run_migrations(db):
+    """
+    Run the migrations of MIGRATIONS on the collections named in the environment. Each migration
+    is a no-op once applied; a failure is logged and does not stop the others.
+
+    Args:
+        db (pymongo.database.Database): Database holding the collections named in the environment.
+    """
+    for env_name, migrations in MIGRATIONS.items():
+        collection_name = os.getenv(env_name)
+        if not collection_name:
+            continue
+        for migration in migrations:
+            try:
+                migrated = migration(db[collection_name])
+            except Exception as e:
+                logging.error(f"Migration {migration.__name__} failed on {collection_name}: {e}")
+                continue
+            if migrated:
+                logging.info(f"Migration {migration.__name__}: {migrated} documents of {collection_name} migrated.")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    client = MongoClient(os.getenv("MONGO_URI"))
+    run_migrations(client[os.getenv("DB_NAME")])
+    client.close()
@@ -0,0 +1,123 @@
+import os
+import logging
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from dotenv import load_dotenv
+from migrations import run_migrations
+
+
+# Indexes needed by the queries of the dashboard and of the summarize scripts,
+# keyed by the environment variable holding the collection name: (keys, create_index options).
+INDEXES = {
+    "FOREX_COLLECTION_NAME": [
+        # One document per quote in the append-only history, range reads per device and
+        # latest rate of every device ($sort/$group in load_recent_forex_data).
+        ([("device", ASCENDING), ("last_refreshed", DESCENDING)], {"unique": True}),
+        # Incremental refresh of the dashboard (last_refreshed >= high-water mark).
+        ([("last_refreshed", ASCENDING)], {}),
+    ],
+    "CRUDE_COLLECTION_NAME": [
+        # One document per day: the summarize script upserts on date. Also used by the
+        # incremental refresh of the dashboard.
+        ([("date", ASCENDING)], {"unique": True}),
+    ],
+    "CRUDE_ROLLUP_COLLECTION_NAME": [
+        # One document per resolution and period: the crude oil summarize script upserts on them.
+        ([("resolution", ASCENDING), ("period", ASCENDING)], {"unique": True}),
+        # Incremental refresh of the dashboard (last_date >= high-water mark).
+        ([("last_date", ASCENDING)], {}),
+    ],
+    "WEATHER_COLLECTION_NAME": [
+        # One document per region and day: the summarize script folds every run into it.
+        ([("region", ASCENDING), ("day", ASCENDING)], {"unique": True}),
+        # Incremental refresh of the dashboard (day >= high-water mark).
+        ([("day", ASCENDING)], {}),
+    ],
+}
+
+# Error codes returned when an index with the same keys but other options already exists.
+INDEX_OPTIONS_CONFLICT = (85, 86)
+# Error code returned when duplicates prevent a unique index from being built.
+DUPLICATE_KEY = 11000
+
+
+def ensure_indexes(db):
+    """
+    Create the indexes of INDEXES that do not exist yet (create_index is a no-op otherwise).
+    - The one-off migrations of the documents written by former versions (see migrations.py)
+      run first.
+    - The duplicates that prevent a unique index from being built are removed first (see
+      _remove_duplicates).
+    - An existing index with the same keys but other options (e.g. not unique) is rebuilt, once
+      nothing prevents the new one from being built.
+
+    Args:
+        db (pymongo.database.Database): Database holding the collections named in the environment.
+    """
+    run_migrations(db)
+    for env_name, indexes in INDEXES.items():
+        collection_name = os.getenv(env_name)
+        if not collection_name:
+            continue
+        for keys, options in indexes:
+            try:
+                _create_index(db[collection_name], keys, options)
+            except OperationFailure as e:
+                logging.error(f"Could not create index {keys} on {collection_name}: {e}")
+
+
+def _create_index(collection, keys, options):
+    """Create an index, rebuilding an existing index with the same keys but other options."""
+    try:
+        collection.create_index(keys, **options)
+        return
+    except OperationFailure as e:
+        if e.code not in INDEX_OPTIONS_CONFLICT + (DUPLICATE_KEY,):
+            raise
+        conflict = e.code in INDEX_OPTIONS_CONFLICT
+
+    if options.get("unique"):
+        removed = _remove_duplicates(collection, keys)
+        if removed:
+            logging.warning(f"Removed {removed} duplicate documents from {collection.name} for index {keys}.")
+    if not conflict:
+        collection.create_index(keys, **options)
+        return
+
+    # The existing index is only dropped now that the new one can be built.
+    collection.drop_index(keys)
+    try:
+        collection.create_index(keys, **options)
+    except OperationFailure:
+        # Keep the query path indexed, e.g. if duplicates were written in the meantime.
+        collection.create_index(keys)
+        raise
+
+
+def _remove_duplicates(collection, keys):
+    """
+    Delete the documents whose values of 'keys' are those of another document, keeping the last
+    inserted one (largest _id), as the upserts of the summarize scripts would have left it.
+
+    Returns:
+        int: Number of documents deleted.
+    """
+    fields = [field for field, _ in keys]
+    pipeline = [
+        {"$sort": {"_id": DESCENDING}},
+        {"$group": {"_id": {field: f"${field}" for field in fields}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    removed = 0
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        removed += collection.delete_many({"_id": {"$in": group["ids"][1:]}}).deleted_count
+    return removed
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    client = MongoClient(os.getenv("MONGO_URI"))
+    ensure_indexes(client[os.getenv("DB_NAME")])
+    logging.info("Indexes are up to date.")
+    client.close()
@@ -0,0 +1,128 @@
+import os
+import glob
+import gzip
+import json
+from itertools import islice
+
+
+# Number of characters read from a raw file at a time by iter_json_array.
+READ_BLOCK_SIZE = 1 << 16
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def list_raw_files(directory, include_gzip=False):
+    """
+    List the raw JSON files of a directory.
+
+    Args:
+        directory (str): Directory of the raw files.
+        include_gzip (bool): Also list the '*.json.gz' files (the collectors compress old files).
+
+    Returns:
+        list[str]: Paths of the files.
+    """
+    files = glob.glob(os.path.join(directory, "*.json"))
+    if include_gzip:
+        files += glob.glob(os.path.join(directory, "*.json.gz"))
+    return sorted(files)
+
+
+def open_raw_file(path):
+    """Open a raw JSON file as text, decompressing it on the fly if it ends with '.gz'."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_json_array(f, key, block_size=READ_BLOCK_SIZE):
+    """
+    Yield the items of the array stored under 'key' in the JSON object of a file, one at a time.
+    - The file is read by blocks of 'block_size' characters and each item is decoded as soon as it
+      is complete, so memory is bounded by the size of an item, not by the size of the file.
+    - 'key' is looked up as the first '"key": [' of the file (the raw files have it at the top level).
+
+    Args:
+        f (file): File opened in text mode (see open_raw_file).
+        key (str): Name of the array.
+        block_size (int): Number of characters read at a time.
+
+    Raises:
+        json.JSONDecodeError: If the file is not valid JSON around the array.
+        KeyError: If the file has no array named 'key'.
+    """
+    buffer, eof = "", False
+
+    def read():
+        nonlocal buffer, eof
+        block = f.read(block_size)
+        eof = not block
+        buffer += block
+
+    # Find the opening bracket of the array.
+    token = json.dumps(key)
+    while True:
+        start = buffer.find(token)
+        if start < 0:
+            # Keep the end of the buffer, in case the key is split between two blocks.
+            buffer = buffer[-len(token):]
+        else:
+            pos = _skip_whitespace(buffer, start + len(token))
+            if pos < len(buffer) and buffer[pos] != ":":
+                # The key appears as a value: look further.
+                buffer = buffer[pos:]
+                continue
+            pos = _skip_whitespace(buffer, pos + 1)
+            if pos < len(buffer):
+                if buffer[pos] != "[":
+                    raise json.JSONDecodeError(f"'{key}' is not an array", buffer, pos)
+                buffer = buffer[pos + 1:]
+                break
+            buffer = buffer[start:]
+        if eof:
+            raise KeyError(key)
+        read()
+
+    # Decode the items until the closing bracket.
+    pos = 0
+    while True:
+        pos = _skip_whitespace(buffer, pos)
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+
+        item, end = None, None
+        if pos < len(buffer):
+            try:
+                item, end = _DECODER.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        # An item is complete once the next ',' or ']' has been read (a number may be cut).
+        after = _skip_whitespace(buffer, end) if end is not None else len(buffer)
+        if after == len(buffer) or buffer[after] not in ",]":
+            if eof:
+                raise json.JSONDecodeError(f"Unterminated array '{key}'", buffer, after)
+            buffer = buffer[pos:]
+            pos = 0
+            read()
+            continue
+
+        yield item
+        pos = after + 1 if buffer[after] == "," else after
+
+
+def chunked(items, size):
+    """Group an iterable into lists of at most 'size' items."""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _skip_whitespace(text, pos):
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
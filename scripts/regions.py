@@ -0,0 +1,97 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+# Regions of the USA, as (name, (lat_min, lat_max), (lon_min, lon_max)) with inclusive bounds.
+# A point on the boundary of several regions belongs to the first one; a region may be made of
+# several boxes listed under the same name.
+DEFAULT_REGIONS = [
+    ("Northeast", (37, 49), (-80, -67)),
+    ("Southwest", (24, 37), (-125, -102)),
+    ("West", (37, 49), (-125, -102)),
+    ("Southeast", (24, 37), (-102, -80)),
+    ("Midwest", (37, 49), (-102, -80)),
+]
+
+# Region of the points outside of every region of the table.
+OTHER_REGION = "Other"
+
+
+def load_regions(path=None):
+    """
+    Load the region table from a JSON file, or return DEFAULT_REGIONS.
+    - The file holds a list of {"name": str, "lat": [min, max], "lon": [min, max]}, in priority order.
+
+    Args:
+        path (str | None): Path of the file (default: the WEATHER_REGIONS_FILE environment variable).
+
+    Returns:
+        list[tuple]: Region table, as DEFAULT_REGIONS.
+    """
+    path = path or os.getenv("WEATHER_REGIONS_FILE")
+    if not path:
+        return DEFAULT_REGIONS
+
+    with open(path, "r") as f:
+        table = json.load(f)
+    return [(region["name"], tuple(region["lat"]), tuple(region["lon"])) for region in table]
+
+
+class RegionClassifier:
+    """
+    Vectorized lookup of the region of (latitude, longitude) points.
+    - 'codes' evaluates the region table with np.select over whole arrays.
+    - 'classify' only evaluates it on the grid of the distinct latitudes x distinct longitudes:
+      every point then resolves to its region with a single integer index into that grid, so
+      hourly rows sharing the coordinates of a few hundred grid points cost one lookup each.
+    """
+
+    def __init__(self, regions=None):
+        regions = load_regions() if regions is None else regions
+        self.names = list(dict.fromkeys([name for name, _, _ in regions] + [OTHER_REGION]))
+        # Position in 'names' of the region of every box of the table.
+        self.box_codes = np.array([self.names.index(name) for name, _, _ in regions], dtype=np.int16)
+        self.bounds = np.array([(*lat, *lon) for _, lat, lon in regions], dtype=float).reshape(-1, 4)
+
+    def codes(self, lat, lon):
+        """
+        Return the position in 'names' of the region of every point.
+
+        Args:
+            lat (array-like): Latitudes.
+            lon (array-like): Longitudes, of the same shape.
+
+        Returns:
+            np.ndarray: Region codes, of the broadcast shape of 'lat' and 'lon'.
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        conditions = [
+            (lat_min <= lat) & (lat <= lat_max) & (lon_min <= lon) & (lon <= lon_max)
+            for lat_min, lat_max, lon_min, lon_max in self.bounds
+        ]
+        other = self.names.index(OTHER_REGION)
+        return np.select(conditions, self.box_codes, default=other).astype(np.int16)
+
+    def classify(self, lat, lon):
+        """
+        Return the region of every point.
+
+        Args:
+            lat (array-like): Latitudes.
+            lon (array-like): Longitudes, of the same length.
+
+        Returns:
+            pd.Categorical: Region names, with the categories 'names'.
+        """
+        lat_codes, lats = pd.factorize(np.asarray(lat, dtype=float), use_na_sentinel=False)
+        lon_codes, lons = pd.factorize(np.asarray(lon, dtype=float), use_na_sentinel=False)
+        grid = self.codes(lats[:, None], lons[None, :])
+        cells = lat_codes * len(lons) + lon_codes
+        return pd.Categorical.from_codes(grid.ravel()[cells], categories=self.names)
+
+    def region(self, lat, lon):
+        """Return the region name of a single point."""
+        return self.names[int(self.codes(lat, lon))]
@@ -1,12 +1,17 @@
 import pandas as pd
-import glob
 import os
 import json
 import re
-from pymongo import MongoClient
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from pymongo import MongoClient, UpdateOne
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
+from mongo_indexes import ensure_indexes
+from regions import RegionClassifier
+from raw_files import list_raw_files, open_raw_file
+from archive import archive_rows
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -19,6 +24,10 @@ COLLECTION_NAME = os.getenv("WEATHER_COLLECTION_NAME")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 
+# Region lookup, from the table of WEATHER_REGIONS_FILE (default: regions.DEFAULT_REGIONS).
+REGION_CLASSIFIER = RegionClassifier()
+
+
 def get_region(lat, lon):
     """
     Determine the region in the USA based on latitude and longitude.
@@ -30,74 +39,154 @@ def get_region(lat, lon):
     Returns:
         str: Name of the region (e.g., "Northeast", "Southwest", etc.).
     """
-    if 37 <= lat <= 49 and -80 <= lon <= -67:
-        return "Northeast"
-    elif 24 <= lat <= 37 and -125 <= lon <= -102:
-        return "Southwest"
-    elif 37 <= lat <= 49 and -125 <= lon <= -102:
-        return "West"
-    elif 24 <= lat <= 37 and -102 <= lon <= -80:
-        return "Southeast"
-    elif 37 <= lat <= 49 and -102 <= lon <= -80:
-        return "Midwest"
-    else:
-        return "Other"
+    return REGION_CLASSIFIER.region(lat, lon)
+
+# Columns of the parsed hourly data.
+HOURLY_COLUMNS = ["timestamp", "latitude", "longitude", "temperature", "wind_speed"]
+
+# Variables summarized per (region, day).
+SUMMARY_VARIABLES = ["temperature", "wind_speed"]
+
+# Number of processes parsing the raw files (default: one per CPU core).
+PARSE_WORKERS = int(os.getenv("WEATHER_PARSE_WORKERS", os.cpu_count() or 1))
+
+# Also process the '*.json.gz' files (old files compressed by the collector).
+INCLUDE_GZIP = os.getenv("INGEST_INCLUDE_GZIP", "0") == "1"
+
 
-def load_weather_data(input_dir):
+def parse_weather_file(file):
     """
-    Load weather data from JSON files and parse hourly information.
+    Parse the hourly data of one raw weather file into NumPy columns.
+    - A file holds either one point (weather_data_collector.sh, coordinates in the file name) or
+      the list of every point of a run (collector.py).
+    - Hours missing the temperature or the wind speed are dropped with a mask.
+
+    Args:
+        file (str): Path of the raw weather data file.
+
+    Returns:
+        dict[str, np.ndarray] | None: Columns of HOURLY_COLUMNS, or None if the file cannot be parsed.
+    """
+    try:
+        # Each file holds the hours of a single day: it is small enough to load at once.
+        with open_raw_file(file) as f:
+            data = json.load(f)
+
+        if isinstance(data, list):
+            locations = [parse_location(location) for location in data]
+            locations = [columns for columns in locations if columns is not None]
+            if not locations:
+                return None
+            return {
+                column: np.concatenate([columns[column] for columns in locations])
+                for column in HOURLY_COLUMNS
+            }
+
+        match = re.search(r"weather_data_(\-?\d+)_\-(\d+)_", file)
+        lat, lon = None, None
+        if match:
+            lat, lon = float(match.group(1)), -float(match.group(2))
+        return parse_location(data, lat, lon)
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding JSON in file {file}: {e}")
+    except KeyError as e:
+        logging.error(f"Missing key in file {file}: {e}")
+    except Exception as e:
+        logging.error(f"Unexpected error processing file {file}: {e}")
+    return None
+
+
+def parse_location(data, lat=None, lon=None):
+    """
+    Parse the hourly data of one Open-Meteo location object into NumPy columns.
+
+    Args:
+        data (dict): Location object.
+        lat (float | None): Latitude of the point (default: the one of the object).
+        lon (float | None): Longitude of the point (default: the one of the object).
+
+    Returns:
+        dict[str, np.ndarray] | None: Columns of HOURLY_COLUMNS, or None without hourly data.
+    """
+    if lat is None or lon is None:
+        lat, lon = data.get("latitude"), data.get("longitude")
+
+    if "hourly" not in data:
+        return None
+
+    hourly_data = data["hourly"]
+    times = np.array(hourly_data["time"], dtype="datetime64[m]")
+    missing = [None] * len(times)
+    # None (null in the JSON) becomes NaN in a float array.
+    temperature = np.array(hourly_data.get("temperature_2m", missing), dtype=float)
+    wind_speed = np.array(hourly_data.get("wind_speed_10m", missing), dtype=float)
+
+    valid = ~np.isnan(temperature) & ~np.isnan(wind_speed)
+    count = int(valid.sum())
+    return {
+        "timestamp": times[valid],
+        "latitude": np.full(count, lat, dtype=float),
+        "longitude": np.full(count, lon, dtype=float),
+        "temperature": temperature[valid],
+        "wind_speed": wind_speed[valid],
+    }
+
+
+def load_weather_data(input_dir, workers=PARSE_WORKERS, include_gzip=INCLUDE_GZIP):
+    """
+    Load weather data from the JSON files of a directory and parse hourly information.
 
     Args:
         input_dir (str): Directory containing raw weather data files.
+        workers (int): Number of processes parsing the files.
+        include_gzip (bool): Also parse the '*.json.gz' files compressed by the collector.
 
     Returns:
-        list[dict]: A list of parsed weather data dictionaries.
+        pd.DataFrame: Hourly weather data (columns HOURLY_COLUMNS).
     """
-    files = glob.glob(os.path.join(input_dir, "*.json"))
-    all_data = []
+    return parse_weather_files(list_raw_files(input_dir, include_gzip=include_gzip), workers)
 
-    for file in files:
-        try:
-            match = re.search(r"weather_data_(\-?\d+)_\-(\d+)_", file)
-            lat, lon = None, None
-            if match:
-                lat, lon = float(match.group(1)), -float(match.group(2))  
-
-            with open(file, "r") as f:
-                data = json.load(f)
-
-                if not lat or not lon:
-                    lat, lon = data.get("latitude"), data.get("longitude")
-
-                if "hourly" in data:
-                    hourly_data = data["hourly"]
-                    for i, time in enumerate(hourly_data["time"]):
-                        temperature = hourly_data.get("temperature_2m", [None])[i]
-                        wind_speed = hourly_data.get("wind_speed_10m", [None])[i]
-
-                        if temperature is not None and wind_speed is not None:
-                            all_data.append({
-                                "timestamp": time,
-                                "latitude": lat,
-                                "longitude": lon,
-                                "temperature": temperature,
-                                "wind_speed": wind_speed,
-                            })
-        except json.JSONDecodeError as e:
-            logging.error(f"Error decoding JSON in file {file}: {e}")
-        except KeyError as e:
-            logging.error(f"Missing key in file {file}: {e}")
-        except Exception as e:
-            logging.error(f"Unexpected error processing file {file}: {e}")
-
-    return all_data
+def parse_weather_files(files, workers=PARSE_WORKERS, failed=None):
+    """
+    Parse the hourly information of raw weather files.
+    - Files are parsed by a pool of 'workers' processes (in this process if workers <= 1).
+    - The columns of every file are concatenated once at the end.
+
+    Args:
+        files (list[str]): Paths of the raw weather data files.
+        workers (int): Number of processes parsing the files.
+        failed (list | None): If given, the paths of the files that could not be parsed (e.g.
+            still being written) are appended to it.
+
+    Returns:
+        pd.DataFrame: Hourly weather data (columns HOURLY_COLUMNS).
+    """
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(files) // (workers * 4))
+            parsed = list(executor.map(parse_weather_file, files, chunksize=chunksize))
+    else:
+        parsed = [parse_weather_file(file) for file in files]
+
+    if failed is not None:
+        failed.extend(file for file, columns in zip(files, parsed) if columns is None)
+    parsed = [columns for columns in parsed if columns is not None]
+    if not parsed:
+        return pd.DataFrame(columns=HOURLY_COLUMNS)
+
+    return pd.DataFrame({
+        column: np.concatenate([columns[column] for columns in parsed])
+        for column in HOURLY_COLUMNS
+    })
 
 def summarize_data(data):
     """
-    Generate daily summaries of weather data.
+    Generate mergeable daily summaries of weather data.
+    - One row per (region, day) with the count, sum and max of each variable of SUMMARY_VARIABLES,
+      so that summaries of the same day from several runs can be folded together.
 
     Args:
-        data (list[dict]): List of parsed weather data.
+        data (pd.DataFrame): Hourly weather data returned by load_weather_data.
 
     Returns:
         pd.DataFrame: A DataFrame containing daily summaries.
@@ -108,39 +197,118 @@ def summarize_data(data):
         return pd.DataFrame()
 
     df["timestamp"] = pd.to_datetime(df["timestamp"])
-    df["day"] = pd.to_datetime(df["timestamp"].dt.date)
-    df["region"] = df.apply(lambda row: get_region(row["latitude"], row["longitude"]), axis=1)
+    df["day"] = df["timestamp"].dt.normalize()
+    df["region"] = REGION_CLASSIFIER.classify(df["latitude"], df["longitude"])
 
-    daily_summary = df.groupby(["region", "day"]).agg({
-        "temperature": "mean",
-        "wind_speed": "max"
+    daily_summary = df.groupby(["region", "day"], observed=True).agg(**{
+        f"{variable}_{statistic}": (variable, statistic)
+        for variable in SUMMARY_VARIABLES
+        for statistic in ("count", "sum", "max")
     }).reset_index()
 
     daily_summary["summary_date"] = datetime.now().isoformat()
     return daily_summary
 
+def build_upserts(data):
+    """
+    Build one UpdateOne(upsert=True) per (region, day) summary, from the columns of the DataFrame.
+    - Counts and sums are added with $inc and maxima merged with $max, so the run is folded into
+      the document of the day (created on its first run) instead of adding another one.
+
+    Args:
+        data (pd.DataFrame): DataFrame returned by summarize_data.
+
+    Returns:
+        list[UpdateOne]: Operations for bulk_write.
+    """
+    regions = data["region"].astype(str).tolist()
+    days = data["day"].dt.to_pydatetime()
+    increments = {
+        f"{variable}_{statistic}": data[f"{variable}_{statistic}"].tolist()
+        for variable in SUMMARY_VARIABLES
+        for statistic in ("count", "sum")
+    }
+    maxima = {
+        f"{variable}_max": data[f"{variable}_max"].tolist()
+        for variable in SUMMARY_VARIABLES
+    }
+    summary_dates = data["summary_date"].tolist()
+
+    operations = []
+    for i, (region, day) in enumerate(zip(regions, days)):
+        operations.append(UpdateOne(
+            {"region": region, "day": day},
+            {
+                "$inc": {field: values[i] for field, values in increments.items()},
+                "$max": {field: values[i] for field, values in maxima.items()},
+                "$set": {"summary_date": summary_dates[i]},
+            },
+            upsert=True,
+        ))
+    return operations
+
 def save_to_mongo(data, uri, db_name, collection_name):
     """
-    Save summarized data to a MongoDB collection.
+    Fold summarized data into a MongoDB collection (see save_summaries).
 
     Args:
         data (pd.DataFrame): DataFrame containing summarized weather data.
         uri (str): MongoDB URI.
         db_name (str): MongoDB database name.
         collection_name (str): MongoDB collection name.
+
+    Returns:
+        bool: True if the data was saved; on failure, the raw files must be kept.
     """
     try:
         client = MongoClient(uri)
         db = client[db_name]
-        collection = db[collection_name]
-
-        documents = data.to_dict(orient="records")
-        if documents:
-            collection.insert_many(documents)
-            logging.info(f"Inserted {len(documents)} summaries into MongoDB.")
+        ensure_indexes(db)
+        save_summaries(db[collection_name], data)
         client.close()
     except Exception as e:
         logging.error(f"Failed to save data to MongoDB: {e}")
+        return False
+    return True
+
+def save_summaries(collection, data):
+    """
+    Fold summarized data into a MongoDB collection, with a single unordered bulk write, and into
+    the columnar archive (see archive.py).
+
+    Args:
+        collection (pymongo.collection.Collection): Weather collection.
+        data (pd.DataFrame): DataFrame containing summarized weather data.
+    """
+    operations = build_upserts(data)
+    if operations:
+        result = collection.bulk_write(operations, ordered=False)
+        logging.info(
+            f"Saved {len(operations)} summaries into MongoDB "
+            f"({result.upserted_count} new days, {result.modified_count} updated)."
+        )
+        archive_rows("weather", data)
+
+def ingest_files(collection, files, workers=PARSE_WORKERS, failed=None):
+    """
+    Parse, summarize and fold a batch of raw weather files into a MongoDB collection.
+
+    Args:
+        collection (pymongo.collection.Collection): Weather collection.
+        files (list[str]): Paths of the raw weather data files.
+        workers (int): Number of processes parsing the files.
+        failed (list | None): If given, the paths of the files that could not be parsed are
+            appended to it (see parse_weather_files): they must not be deleted.
+
+    Returns:
+        int: Number of (region, day) summaries saved.
+    """
+    daily_summary = summarize_data(parse_weather_files(files, workers, failed))
+    if daily_summary.empty:
+        logging.warning("No valid data to save.")
+        return 0
+    save_summaries(collection, daily_summary)
+    return len(daily_summary)
 
 def cleanup_files(files):
     """
@@ -163,18 +331,25 @@ if __name__ == "__main__":
     script_dir = os.path.dirname(os.path.realpath(__file__))
     input_dir = os.path.join(script_dir, "../data/raw/weather")
 
-    files = glob.glob(os.path.join(input_dir, "*.json"))
+    files = list_raw_files(input_dir, include_gzip=INCLUDE_GZIP)
 
-    all_data = load_weather_data(input_dir)
+    # Only the files listed here are parsed, then deleted (except those that could not be parsed,
+    # and all of them if the summaries could not be saved).
+    failed = []
+    all_data = parse_weather_files(files, failed=failed)
+    saved = True
 
-    if all_data:
+    if not all_data.empty:
         daily_summary = summarize_data(all_data)
 
         if not daily_summary.empty:
-            save_to_mongo(daily_summary, MONGO_URI, DB_NAME, COLLECTION_NAME)
+            saved = save_to_mongo(daily_summary, MONGO_URI, DB_NAME, COLLECTION_NAME)
         else:
             logging.warning("No valid data to save.")
     else:
         logging.warning("No valid data to process.")
 
-    cleanup_files(files)
+    if saved:
+        cleanup_files([file for file in files if file not in failed])
+    else:
+        logging.warning(f"Keeping the {len(files)} raw files for the next run.")